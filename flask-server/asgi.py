@@ -0,0 +1,138 @@
+import json
+
+from async_engine import AsyncQueryEngine
+from engine_config import create_engine, preload
+from metrics import METRICS
+from request_params import BadRequest, parse_batch, parse_body, parse_query, parse_stream
+
+"""
+Async serving mode: the /query, /query/batch and /query/stream API of server.py as a plain ASGI app, with no framework.
+Run it with any ASGI server from this directory, e.g.
+    uvicorn asgi:app --workers 2
+The request and response bodies are the same as server.py's.
+A /query/stream page is read on the thread pool in one go, then sent one line per result.
+"""
+
+# created at lifespan startup, on the server's event loop
+engine: AsyncQueryEngine | None = None
+
+# same as flask_cors' defaults in server.py
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+    (b'access-control-allow-headers', b'content-type'),
+]
+
+
+async def read_body(receive) -> bytes:
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body', False):
+            return body
+
+
+async def respond(send, status: int, body: bytes, content_type: bytes = b'application/json'):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type),
+            (b'content-length', str(len(body)).encode()),
+            *CORS_HEADERS,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def respond_json(send, status: int, value):
+    await respond(send, status, json.dumps(value).encode())
+
+
+async def query(receive, send):
+    try:
+        params = parse_query(parse_body(await read_body(receive)))
+    except BadRequest as e:
+        await respond_json(send, 400, {'error': str(e)})
+        return
+
+    results = await engine.query(**params)
+    with METRICS.time('encode'):
+        # 'output' stays a JSON string, as clients expect the old subprocess output
+        body = json.dumps({'output': json.dumps(results)}).encode()
+    await respond(send, 200, body)
+
+
+async def query_batch(receive, send):
+    try:
+        inputs, params = parse_batch(parse_body(await read_body(receive)))
+    except BadRequest as e:
+        await respond_json(send, 400, {'error': str(e)})
+        return
+
+    outputs = await engine.query_batch(inputs, **params)
+    with METRICS.time('encode'):
+        body = json.dumps({'outputs': [
+            {'input': input, 'output': output}
+            for input, output in zip(inputs, outputs)
+        ]}).encode()
+    await respond(send, 200, body)
+
+
+async def query_stream(receive, send):
+    try:
+        params = parse_stream(parse_body(await read_body(receive)))
+        # raises ValueError for a cursor of another query before anything is sent
+        items = await engine.stream(**params)
+    except (BadRequest, ValueError) as e:
+        await respond_json(send, 400, {'error': str(e)})
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'application/x-ndjson'), *CORS_HEADERS],
+    })
+    for item in items:
+        await send({'type': 'http.response.body', 'body': (json.dumps(item) + '\n').encode(), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def lifespan(receive, send):
+    global engine
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            engine = AsyncQueryEngine(create_engine())
+            await engine.run(preload, engine.engine)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    method, path = scope['method'], scope['path']
+    if method == 'OPTIONS':
+        await respond(send, 204, b'')
+    elif path == '/query' and method == 'POST':
+        await query(receive, send)
+    elif path == '/query/batch' and method == 'POST':
+        await query_batch(receive, send)
+    elif path == '/query/stream' and method == 'POST':
+        await query_stream(receive, send)
+    elif path == '/metrics' and method == 'GET':
+        text = METRICS.render(engine.engine.stats())
+        await respond(send, 200, text.encode(), b'text/plain; version=0.0.4')
+    elif path == '/' and method == 'GET':
+        await respond(send, 200, b'<h1>Hello World<h1>', b'text/html')
+    else:
+        await respond_json(send, 404, {'error': f'no route for {method} {path}'})
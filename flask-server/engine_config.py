@@ -0,0 +1,48 @@
+import logging
+import os
+import sqlite3 as sql
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'query'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'rank'))
+from query_engine import QueryEngine, ResponseCache, DEFAULT_RESPONSE_CACHE_SIZE  # noqa: E402
+from rhyme_cache import RhymeCache  # noqa: E402
+from rank_puns import PunRanker  # noqa: E402
+
+"""
+The QueryEngine configuration shared by server.py and asgi.py, read from the environment.
+Importing this module also makes src/query and src/rank importable.
+"""
+
+DB_PATH = '../src/my_db.sqlite'
+# Datamuse responses, kept between restarts; empty turns the rhyme cache off, e.g. for load tests
+RHYME_CACHE_PATH = os.environ.get('PUNGENT_RHYME_CACHE_PATH', '../src/rhyme_cache.sqlite')
+# 0 turns the response cache off, e.g. for load tests
+RESPONSE_CACHE_SIZE = int(os.environ.get('PUNGENT_RESPONSE_CACHE_SIZE', DEFAULT_RESPONSE_CACHE_SIZE))
+# serve from a snapshot made by src/query/export_serving_snapshot.py instead, if set
+SNAPSHOT_PATH = os.environ.get('PUNGENT_SNAPSHOT_PATH')
+
+logger = logging.getLogger(__name__)
+
+
+def create_engine() -> QueryEngine:
+    return QueryEngine(
+        SNAPSHOT_PATH or DB_PATH,
+        snapshot=SNAPSHOT_PATH is not None,
+        rhyme_cache=RhymeCache(RHYME_CACHE_PATH) if RHYME_CACHE_PATH else None,
+        response_cache=ResponseCache(RESPONSE_CACHE_SIZE) if RESPONSE_CACHE_SIZE > 0 else None,
+        ranker=PunRanker(),
+        use_lexicon=True,
+    )
+
+
+def preload(engine: QueryEngine):
+    """
+    Builds the in-memory lexicon and near-rhyme index before the first request.
+    A missing DB, or one on an old schema, is logged rather than raised, so the server still starts;
+    the structures are then built on first use, once it is fixed.
+    """
+    try:
+        engine.load()
+    except (sql.Error, OSError):
+        logger.exception("could not load %s, serving without preloading", engine.db_path)
@@ -0,0 +1,90 @@
+import json
+
+from query_engine import DEFAULT_PAGE_SIZE
+from query_rhymes import DEFAULT_PER_SOURCE_LIMIT, MATCH_MODES, NO_PER_SOURCE_LIMIT
+
+"""
+Request bodies of the /query routes, turned into QueryEngine arguments.
+Shared by server.py and asgi.py; anything malformed raises BadRequest, which both answer with a 400.
+"""
+
+
+class BadRequest(Exception):
+    pass
+
+
+def parse_body(body: bytes) -> dict:
+    """
+    The JSON object a request body holds
+    """
+    try:
+        data = json.loads(body)
+    except ValueError as e:
+        raise BadRequest(f"request body is not JSON: {e}")
+    if not isinstance(data, dict):
+        raise BadRequest("request body must be a JSON object")
+    return data
+
+
+def parse_int(data: dict, name: str, default: int | None, minimum: int | None = None) -> int | None:
+    value = data.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"{name} must be an integer")
+    if minimum is not None and value < minimum:
+        raise BadRequest(f"{name} must be at least {minimum}")
+    return value
+
+
+def parse_query(data: dict) -> dict:
+    """
+    Turns a /query request body into QueryEngine keyword arguments
+    """
+    match = data.get("match", "exact")
+    if match not in MATCH_MODES:
+        raise BadRequest(f"match must be one of {', '.join(MATCH_MODES)}")
+    if not isinstance(data.get("input"), str):
+        raise BadRequest("input must be a string")
+    if not isinstance(data.get("filters"), dict):
+        raise BadRequest("filters must be an object of source names to booleans")
+    if "allowNSFW" not in data:
+        raise BadRequest("allowNSFW is required")
+
+    return {
+        'input': [data["input"]],
+        'mode': 'word',
+        'filters': [name for name, is_selected in data["filters"].items() if is_selected],
+        'nsfw_enabled': bool(data["allowNSFW"]),
+        # -1 for no limit
+        'per_source_limit': parse_int(data, "perSourceLimit", DEFAULT_PER_SOURCE_LIMIT, NO_PER_SOURCE_LIMIT),
+        'match': match,
+        'top_k': parse_int(data, "topK", None, 1),
+    }
+
+
+def parse_batch(data: dict) -> tuple[list[str], dict]:
+    """
+    The inputs of a /query/batch body, and the QueryEngine.query_batch keyword arguments for them
+    """
+    inputs = data.get("inputs")
+    if not isinstance(inputs, list) or not all(isinstance(input, str) for input in inputs):
+        raise BadRequest("inputs must be a list of strings")
+    params = parse_query({**data, "input": ""})
+    del params['input']
+    return inputs, params
+
+
+def parse_stream(data: dict) -> dict:
+    """
+    Turns a /query/stream body into QueryEngine.stream keyword arguments
+    """
+    params = parse_query(data)
+    del params['top_k']
+    after = data.get("cursor")
+    if after is not None and not isinstance(after, str):
+        raise BadRequest("cursor must be a string")
+    page_size = parse_int(data, "pageSize", DEFAULT_PAGE_SIZE, 1)
+    return {**params, 'after': after, 'page_size': page_size}
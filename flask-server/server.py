@@ -1,16 +1,49 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
-import subprocess
 import json
+import time
+
+from engine_config import create_engine, preload
+from metrics import METRICS
+from request_params import BadRequest, parse_batch, parse_body, parse_query, parse_stream
 
 app = Flask(__name__)
 CORS(app)
 
+# shared by all requests, opens its connections lazily
+engine = create_engine()
+preload(engine)
+
 # class Data:
 #     def update_params(params: object) -> object:
 # output = "success"
 
 
+@app.before_request
+def start_timer():
+    g.start = time.perf_counter()
+
+
+@app.after_request
+def record_duration(response):
+    if request.endpoint is not None and 'start' in g:
+        METRICS.observe('request_seconds', time.perf_counter() - g.start, route=request.endpoint)
+    return response
+
+
+@app.errorhandler(BadRequest)
+def bad_request(e):
+    return jsonify({'error': str(e)}), 400
+
+
+@app.route('/metrics')
+def metrics():
+    """
+    Stage latencies, row counts and cache counters, in the Prometheus text format
+    """
+    return Response(METRICS.render(engine.stats()), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/')
 def home():
     return "<h1>Hello World<h1>"
@@ -19,31 +52,43 @@ def home():
 @app.route('/query', methods=['POST'])
 def query():
     if request.method == 'POST':
-        data = json.loads(request.data)
-        word = data["input"]
-        filters = data["filters"]
-        nsfw = data["allowNSFW"]
-
-        filter_list = []
-        for filter_name, isSelected in filters.items():
-            if isSelected:
-                filter_list.append(filter_name)
+        results = engine.query(**parse_query(parse_body(request.data)))
 
-        filter_str = json.dumps(filter_list)
+        # 'output' stays a JSON string, as clients expect the old subprocess output
+        with METRICS.time('encode'):
+            return jsonify({'output': json.dumps(results)})
 
-        params = ['python', '../src/query/query_rhymes.py', '../src/my_db.sqlite',
-                  word, '--filters', filter_str, '--mode', 'word']
-        if nsfw:
-            params.append('--nsfw')
 
-        print(params)
+@app.route('/query/batch', methods=['POST'])
+def query_batch():
+    """
+    Same body as /query, with a list of words as 'inputs' instead of 'input'.
+    Responds with {"outputs": [{"input": ..., "output": [...]}, ...]}, in input order.
+    """
+    inputs, params = parse_batch(parse_body(request.data))
+    outputs = engine.query_batch(inputs, **params)
+    with METRICS.time('encode'):
+        return jsonify({'outputs': [
+            {'input': input, 'output': output}
+            for input, output in zip(inputs, outputs)
+        ]})
 
-        try:
-            output = subprocess.check_output(params)
-        except subprocess.CalledProcessError as e:
-            output = e.output
 
-        return jsonify({'output': output.decode('utf-8')})
+@app.route('/query/stream', methods=['POST'])
+def query_stream():
+    """
+    Same body as /query, plus optional 'cursor' and 'pageSize'.
+    Responds with one JSON result per line as they are produced,
+    followed by a {"cursor": ...} line to pass back for the next page (null on the last page).
+    """
+    params = parse_stream(parse_body(request.data))
+    try:
+        # checks the cursor against the query's rhymes before anything is sent
+        items = engine.stream(**params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    lines = (json.dumps(item) + '\n' for item in items)
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
 
 
 if __name__ == "__main__":
@@ -2,9 +2,16 @@ import json
 import csv  
 import itertools
 import os
-import subprocess
+import sqlite3
+import sys
+import time
 from typing import List, Dict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'import'))
+import importer_json_to_sqlite as importer  # noqa: E402
+
+DB_PATH = 'my_db.sqlite'
+
 
 def read_anime_quotes(anime_quotes_path: str) -> List[Dict]:
     anime_quotes = []
@@ -68,14 +75,13 @@ def read_urban_dict(urbandict_words_path: str) -> List[Dict]:
         }
     ]
 
-def import_data(data: List[Dict], batch_size: int, name: str):
-    cmd = f'python3 import/importer_json_to_sqlite.py my_db.sqlite'
-    for i in range(0, len(data), batch_size):
-        batch = data[i:i+batch_size]
-        for item in batch:
-            p = subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE)
-            p.communicate(json.dumps(item).encode())
-            p.wait()
+def import_data(cursor: sqlite3.Cursor, data: List[Dict], batch_size: int, name: str, caches: importer.IdCaches):
+    """
+    Imports the items in transactions of batch_size items, in this process
+    """
+    start = time.perf_counter()
+    count = importer.import_items_bulk(cursor, data, batch_size, caches)
+    print(f"Imported {count} {name} items in {time.perf_counter() - start:.1f}s")
 
 def main():
     data_dir = os.path.abspath(os.path.join(os.getcwd(), 'data'))
@@ -88,29 +94,35 @@ def main():
     urbandict_words_path = os.path.join(data_dir, 'urbandict_words.csv')
     top100_lyrics_path = os.path.join(data_dir, 'top100.txt')
 
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    cursor = conn.cursor()
+    importer.create_all_tables(cursor)
+    # shared by every source, so the ids of words seen in one source are not looked up again
+    caches = importer.IdCaches()
+
     anime_quotes = read_anime_quotes(anime_quotes_path)
     print("Importing anime quotes...")
-    import_data(anime_quotes, batch_size=100, name="anime quotes")
+    import_data(cursor, anime_quotes, batch_size=1000, name="anime quotes", caches=caches)
 
     formal_idioms = read_formal_idioms(formal_idioms_path)
     print("Importing formal idioms...")
-    import_data(formal_idioms, batch_size=100, name="formal idioms")
+    import_data(cursor, formal_idioms, batch_size=1000, name="formal idioms", caches=caches)
 
     phrases = read_common_phrases(phrases_path)
     print("Importing common phrases...")
-    import_data(phrases, batch_size=100, name="common phrases")
+    import_data(cursor, phrases, batch_size=1000, name="common phrases", caches=caches)
 
     static_idioms = read_static_idioms(static_idioms_path)
     print("Importing static idioms...")
-    import_data(static_idioms, batch_size=100, name="static idioms")
+    import_data(cursor, static_idioms, batch_size=1000, name="static idioms", caches=caches)
 
     top_movies = read_top_movies(top_5000_movies_path)
     print("Importing top movies...")
-    import_data(top_movies, batch_size=100, name="top movies")
+    import_data(cursor, top_movies, batch_size=1000, name="top movies", caches=caches)
 
     urban_dict = read_urban_dict(urbandict_words_path)
     print("Importing urban dictionary words...")
-    import_data(urban_dict, batch_size=100, name="urban dictionary words")
+    import_data(cursor, urban_dict, batch_size=1000, name="urban dictionary words", caches=caches)
 
     with open(top100_lyrics_path, "r", encoding="utf-8") as f:
         entries = []
@@ -118,8 +130,9 @@ def main():
             entry = json.loads(line.strip())
             entries.append(entry)
         print("Importing data from top lyrics...")
-        import_data(entries, batch_size=100, name="top_100")
+        import_data(cursor, entries, batch_size=1000, name="top_100", caches=caches)
 
+    conn.close()
     print("Importing into SQLite is done!")
 
 if __name__ == "__main__":
@@ -5,6 +5,10 @@ import json
 import re
 import sys
 import io
+import itertools as its
+import os
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from collections.abc import Iterable, Collection
 
 """
@@ -19,6 +23,15 @@ TODO: handle versioning,
 # used if word_assoc entry is missing 'type' field
 DEFAULT_ASSOC_TYPE = "generic"
 
+# items per transaction in bulk mode
+DEFAULT_BULK_BATCH_SIZE = 10_000
+
+# lines per job sent to the worker processes in parallel mode
+DEFAULT_PARALLEL_CHUNK_SIZE = 500
+
+# key under which prepare_item stores the words of each phrase of a phrase item
+PREPARED_PHRASE_WORDS = "_phrase_words"
+
 # used if no source was given
 # sqlite supports None even for Primary Key. may eventually replace with special id
 ABSENT_SOURCE_ID = None
@@ -84,6 +97,16 @@ tables: list[tuple[str, list[str]]] = [
             "FOREIGN KEY (word_id) REFERENCES word_spelling(word_id)",
         ],
     ),
+    (
+        "word_rhyme",
+        [
+            "word_id INTEGER",
+            "phonetic TEXT",
+            "rhyme_key TEXT NOT NULL",
+            "PRIMARY KEY (word_id, phonetic)",
+            "FOREIGN KEY (word_id, phonetic) REFERENCES word_phonetic(word_id, phonetic)",
+        ],
+    ),
     (
         "word_src",
         [
@@ -142,6 +165,48 @@ tables: list[tuple[str, list[str]]] = [
             "FOREIGN KEY (word_id) REFERENCES word_spelling(word_id)",
         ],
     ),
+    (
+        # denormalized serving table for the query path, maintained at import time.
+        # keyed on phrase_id, so a lookup from phrase_words reads everything it needs
+        # from a single b-tree entry (no joins, no metadata fan-out)
+        "phrase_search",
+        [
+            "phrase_id INTEGER PRIMARY KEY",
+            "phrase_norm TEXT NOT NULL",
+            "source_name TEXT",
+            "is_nsfw BOOLEAN DEFAULT 0",
+            "FOREIGN KEY(phrase_id) REFERENCES phrase(phrase_id)",
+        ],
+    ),
+    (
+        # single row, bumped on every write so readers can invalidate caches
+        "db_generation",
+        [
+            "id INTEGER PRIMARY KEY CHECK (id = 0)",
+            "generation INTEGER NOT NULL",
+        ],
+    ),
+]
+
+
+# (index name, table name, indexed columns)
+indexes: list[tuple[str, str, list[str]]] = [
+    ("word_rhyme_key", "word_rhyme", ["rhyme_key", "word_id"]),
+    # phrase_words' primary key starts with phrase_id, this serves word_id -> phrases
+    ("phrase_words_word_id", "phrase_words", ["word_id", "phrase_id"]),
+    # finds the other copies of a phrase when de-duplicating a page of query results
+    ("phrase_search_norm", "phrase_search", ["phrase_norm", "phrase_id"]),
+]
+
+
+# keep derived tables in sync with the base tables
+sync_triggers: list[str] = [
+    # phrase_search copies is_nsfw, which is updated after import (query_nsfw_phrases)
+    """
+    CREATE TRIGGER IF NOT EXISTS phrase_search_nsfw AFTER UPDATE OF is_nsfw ON phrase BEGIN
+        UPDATE phrase_search SET is_nsfw = new.is_nsfw WHERE phrase_id = new.phrase_id;
+    END
+    """,
 ]
 
 
@@ -149,22 +214,227 @@ def table_to_statement(table_name: str, table_attrs: list[str]):
     return f"CREATE TABLE IF NOT EXISTS {table_name}({','.join(table_attrs)})"
 
 
+def index_to_statement(index_name: str, table_name: str, columns: list[str]):
+    return f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({','.join(columns)})"
+
+
 def create_all_tables(cursor: sqlite3.Cursor):
     for name, fields in tables:
         cursor.execute(table_to_statement(name, fields))
+    for name, table, columns in indexes:
+        cursor.execute(index_to_statement(name, table, columns))
+    for statement in sync_triggers:
+        cursor.execute(statement)
 
 
-# cached tag_name -> tag_id
-CACHED_TAG_IDS: dict[str, int] = {}
+def rebuild_phrase_search(cursor: sqlite3.Cursor):
+    """
+    Rebuilds phrase_search from phrase, phrase_src and source
+    """
+    rows = cursor.execute(
+        """
+        SELECT p.phrase_id, p.phrase, s.name, p.is_nsfw
+        FROM phrase p
+        LEFT JOIN phrase_src ps ON ps.phrase_id = p.phrase_id
+        LEFT JOIN source s ON s.src_id = ps.src_id
+        """
+    ).fetchall()
+    cursor.execute("DELETE FROM phrase_search")
+    cursor.executemany(
+        "INSERT INTO phrase_search(phrase_id, phrase_norm, source_name, is_nsfw) VALUES(?, ?, ?, ?)",
+        [
+            (phrase_id, normalize_phrase(phrase), name, is_nsfw)
+            for phrase_id, phrase, name, is_nsfw in rows
+        ],
+    )
 
 
-def tag_to_id(cursor: sqlite3.Cursor, tag_name: str) -> int:
+def bump_generation(cursor: sqlite3.Cursor):
+    """
+    Increments the DB generation, marking everything cached from the DB as stale
+    """
+    cursor.execute(
+        """
+        INSERT INTO db_generation(id, generation) VALUES(0, 1)
+        ON CONFLICT(id) DO UPDATE SET generation = generation + 1
+        """
+    )
+
+
+# IPA symbols treated as vowels when looking for the start of a rhyme
+IPA_VOWELS = frozenset("aeiouyæɑɒɐəɘɚɛɜɝɞɪɨʉʊʌɔøœɶɤɯʏɵ")
+PRIMARY_STRESS = "ˈ"
+# syllable separators and stress marks, which don't affect whether words rhyme
+RHYME_KEY_IGNORED = frozenset(".ˈˌ /[]")
+
+
+def phonetic_to_rhyme_key(phonetic: str) -> str | None:
+    """
+    Computes the rhyme key of an IPA pronunciation:
+    the last stressed vowel through the end of the word.
+    Words rhyme (perfectly) when they share a rhyme key.
+    Without a stress mark, the last vowel sequence is used instead.
+    Returns None if the pronunciation has no vowels.
+    """
+    phonetic = phonetic.strip().replace("'", PRIMARY_STRESS)
+    stress = phonetic.rfind(PRIMARY_STRESS)
+
+    if stress != -1:
+        # skip the onset of the stressed syllable
+        start = stress
+        while start < len(phonetic) and phonetic[start] not in IPA_VOWELS:
+            start += 1
+    else:
+        # start of the last run of vowels
+        start = len(phonetic)
+        i = len(phonetic) - 1
+        while i >= 0 and phonetic[i] not in IPA_VOWELS:
+            i -= 1
+        while i >= 0 and phonetic[i] in IPA_VOWELS:
+            start = i
+            i -= 1
+
+    key = "".join(c for c in phonetic[start:] if c not in RHYME_KEY_IGNORED)
+    return key if key else None
+
+
+def rebuild_rhyme_keys(cursor: sqlite3.Cursor):
+    """
+    (Re)computes the rhyme key of every pronunciation in word_phonetic.
+    Needed for DBs created before word_rhyme existed.
+    """
+    rows = cursor.execute("SELECT word_id, phonetic FROM word_phonetic").fetchall()
+    cursor.execute("DELETE FROM word_rhyme")
+    insert_rhyme_keys(cursor, rows)
+
+
+def insert_rhyme_keys(
+    cursor: sqlite3.Cursor, pronunciations: Iterable[tuple[int, str]]
+):
+    """
+    pronunciations: (word_id, phonetic)*
+    Inserts the rhyme key of each pronunciation, returns nothing
+    """
+    params = []
+    for word_id, phon in pronunciations:
+        key = phonetic_to_rhyme_key(phon)
+        if key is not None:
+            params.append((word_id, phon, key))
+    cursor.executemany(
+        "INSERT OR IGNORE INTO word_rhyme(word_id, phonetic, rhyme_key) VALUES(?, ?, ?)",
+        params,
+    )
+
+
+class IdCache:
+    """
+    name -> id cache of one lookup table.
+    With a max_size, the least recently used names are evicted beyond it.
+    """
+
+    def __init__(self, max_size: int | None = None):
+        self.max_size = max_size
+        self._ids: OrderedDict[str, int] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def get(self, name: str) -> int | None:
+        id = self._ids.get(name)
+        if id is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.max_size is not None:
+            self._ids.move_to_end(name)
+        return id
+
+    def put(self, name: str, id: int):
+        self._ids[name] = id
+        if self.max_size is not None:
+            self._ids.move_to_end(name)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+                self.evictions += 1
+
+    def load(self, rows: Iterable[tuple[str, int]]):
+        """
+        Fills the cache from (name, id) rows, without counting them as misses
+        """
+        for name, id in rows:
+            self.put(name, id)
+
+    def clear(self):
+        self._ids.clear()
+
+    def stats(self) -> dict[str, int | None]:
+        return {
+            "size": len(self._ids),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class IdCaches:
+    """
+    The id caches of one DB: word spellings, capped at max_spellings if given,
+    and the (small) tag and assoc type tables.
+    Created by the caller and passed to the import functions, which look ids up
+    in the DB every time when given none. Must be cleared when a transaction
+    that inserted ids is rolled back.
+    """
+
+    def __init__(self, max_spellings: int | None = None):
+        self.word_spellings = IdCache(max_spellings)
+        self.tags = IdCache()
+        self.assoc_types = IdCache()
+
+    def preload(self, cursor: sqlite3.Cursor):
+        """
+        Warm start: loads the existing rows of each table in one scan,
+        only the max_spellings most recent spellings if capped
+        """
+        limit = -1 if self.word_spellings.max_size is None else self.word_spellings.max_size
+        self.word_spellings.load(
+            cursor.execute(
+                """
+                SELECT spelling, word_id FROM (
+                    SELECT spelling, word_id FROM word_spelling ORDER BY word_id DESC LIMIT ?
+                )
+                ORDER BY word_id
+                """,
+                (limit,),
+            )
+        )
+        self.tags.load(cursor.execute("SELECT name, tag_id FROM tag"))
+        self.assoc_types.load(cursor.execute("SELECT name, assoc_type_id FROM assoc_type"))
+
+    def clear(self):
+        self.word_spellings.clear()
+        self.tags.clear()
+        self.assoc_types.clear()
+
+    def stats(self) -> dict[str, dict[str, int | None]]:
+        return {
+            "word_spelling": self.word_spellings.stats(),
+            "tag": self.tags.stats(),
+            "assoc_type": self.assoc_types.stats(),
+        }
+
+
+def tag_to_id(cursor: sqlite3.Cursor, tag_name: str, caches: IdCaches | None = None) -> int:
     """
     Inserts the tag if it does not exist already and returns the ID
     """
-    cached_id = CACHED_TAG_IDS.get(tag_name)
-    if cached_id is not None:
-        return cached_id
+    if caches is not None:
+        cached_id = caches.tags.get(tag_name)
+        if cached_id is not None:
+            return cached_id
 
     row: tuple[int] | None = cursor.execute(
         "SELECT tag_id FROM tag WHERE tag.name == ?", [tag_name]
@@ -179,21 +449,19 @@ def tag_to_id(cursor: sqlite3.Cursor, tag_name: str) -> int:
         id is not None
     )  # just to convince mypy. not handling failed insertions anyway
 
-    CACHED_TAG_IDS[tag_name] = id
+    if caches is not None:
+        caches.tags.put(tag_name, id)
     return id
 
 
-# cached tag_name -> tag_id
-CACHED_ASSOC_TYPE_IDS: dict[str, int] = {}
-
-
-def assoc_type_to_id(cursor: sqlite3.Cursor, assoc_type: str) -> int:
+def assoc_type_to_id(cursor: sqlite3.Cursor, assoc_type: str, caches: IdCaches | None = None) -> int:
     """
     Creates the word-assoc-type if it DNE. Returns its id
     """
-    cached_id = CACHED_ASSOC_TYPE_IDS.get(assoc_type)
-    if cached_id is not None:
-        return cached_id
+    if caches is not None:
+        cached_id = caches.assoc_types.get(assoc_type)
+        if cached_id is not None:
+            return cached_id
 
     row: tuple[int] | None = cursor.execute(
         "SELECT assoc_type_id FROM assoc_type WHERE assoc_type.name = ?", [assoc_type]
@@ -208,7 +476,8 @@ def assoc_type_to_id(cursor: sqlite3.Cursor, assoc_type: str) -> int:
         id is not None
     )  # just to convince mypy. not handling failed insertions anyway
 
-    CACHED_ASSOC_TYPE_IDS[assoc_type] = id
+    if caches is not None:
+        caches.assoc_types.put(assoc_type, id)
     return id
 
 
@@ -221,7 +490,7 @@ def insert_metadata(cursor: sqlite3.Cursor, tag_id: int, val: str):
 
 
 def insert_source(
-    cursor: sqlite3.Cursor, source: dict[str, str | list[str]] | None
+    cursor: sqlite3.Cursor, source: dict[str, str | list[str]] | None, caches: IdCaches | None = None
 ) -> int | None:
     """
     Inserts a source object and returns the new ID
@@ -234,7 +503,7 @@ def insert_source(
 
     for tag_name, val in source.items():
         vals = [val] if isinstance(val, str) else val
-        tag_id = tag_to_id(cursor, tag_name)
+        tag_id = tag_to_id(cursor, tag_name, caches)
         for v in vals:
             metadata_id = insert_metadata(cursor, tag_id, v)
             insert_source_metadata(cursor, metadata_id, src_id)
@@ -267,17 +536,14 @@ def insert_source_metadata(cursor: sqlite3.Cursor, metadata_id: int, src_id: int
     )
 
 
-# cache
-CACHED_WORD_SPELLING_IDS: dict[str, int] = {}
-
-
-def spelling_to_id(cursor: sqlite3.Cursor, spelling: str):
+def spelling_to_id(cursor: sqlite3.Cursor, spelling: str, caches: IdCaches | None = None):
     """
     Given a spelling, returns the word_id, creating an entry if needed.
     """
-    cached_id = CACHED_WORD_SPELLING_IDS.get(spelling)
-    if cached_id is not None:
-        return cached_id
+    if caches is not None:
+        cached_id = caches.word_spellings.get(spelling)
+        if cached_id is not None:
+            return cached_id
 
     row: tuple[int] | None = cursor.execute(
         "SELECT word_id FROM word_spelling WHERE word_spelling.spelling = ?",
@@ -290,18 +556,56 @@ def spelling_to_id(cursor: sqlite3.Cursor, spelling: str):
     else:
         id = row[0]
     assert id is not None
-    CACHED_WORD_SPELLING_IDS[spelling] = id
+    if caches is not None:
+        caches.word_spellings.put(spelling, id)
     return id
 
 
-def insert_spellings(cursor: sqlite3.Cursor, words: Collection[str]):
+def spellings_to_ids(
+    cursor: sqlite3.Cursor, spellings: Iterable[str], caches: IdCaches | None = None
+) -> dict[str, int]:
+    """
+    Batch version of spelling_to_id: returns spelling -> word_id for all of spellings.
+    Uncached spellings are inserted with one executemany, and their ids read back with one SELECT.
+    """
+    ids: dict[str, int] = {}
+    missing: list[str] = []
+    for spelling in dict.fromkeys(spellings):
+        cached_id = None if caches is None else caches.word_spellings.get(spelling)
+        if cached_id is not None:
+            ids[spelling] = cached_id
+        else:
+            missing.append(spelling)
+    if not missing:
+        return ids
+
+    cursor.executemany(
+        "INSERT OR IGNORE INTO word_spelling(spelling) VALUES(?)",
+        ((spelling,) for spelling in missing),
+    )
+    # json_each takes any number of spellings as a single parameter
+    rows = cursor.execute(
+        """
+        SELECT spelling, word_id FROM word_spelling
+        WHERE spelling IN (SELECT value FROM json_each(?))
+        """,
+        (json.dumps(missing),),
+    )
+    for spelling, word_id in rows:
+        ids[spelling] = word_id
+        if caches is not None:
+            caches.word_spellings.put(spelling, word_id)
+    return ids
+
+
+def insert_spellings(cursor: sqlite3.Cursor, words: Collection[str], caches: IdCaches | None = None):
     """
     Takes a sequence of words (spellings) and inserts them as equivalent spellings for each other
     For space and time, only entries involving the lexicographically lowest word are made
     """
-    lowest = spelling_to_id(cursor, min(words))
+    lowest = spelling_to_id(cursor, min(words), caches)
     params = [
-        (lowest, spelling_to_id(cursor, word)) for word in words if word != lowest
+        (lowest, spelling_to_id(cursor, word, caches)) for word in words if word != lowest
     ]
     cursor.executemany(
         "INSERT OR IGNORE INTO alt_spelling(word1_id, word2_id) VALUES(?, ?)", params
@@ -312,14 +616,17 @@ def insert_word_phonetic(
     cursor: sqlite3.Cursor, word_id: int, phonetics: Iterable[str]
 ):
     """
-    Inserts all the phonetics as pronounciations for 'word', returns nothing
+    Inserts all the phonetics as pronounciations for 'word', along with their rhyme keys.
+    Returns nothing
     """
     if not phonetics:
         return
+    params = [(word_id, phon) for phon in phonetics]
     cursor.executemany(
         "INSERT OR IGNORE INTO word_phonetic(word_id, phonetic) VALUES(?, ?)",
-        ((word_id, phon) for phon in phonetics),
+        params,
     )
+    insert_rhyme_keys(cursor, params)
 
 
 def insert_word_source(cursor: sqlite3.Cursor, word_id: int, src_id: int | None):
@@ -357,7 +664,33 @@ def insert_phrase_source(cursor: sqlite3.Cursor, phrase_id: int, src_id: int | N
     """
     Inserts source for phrase, returns nothing
     """
-    cursor.execute("INSERT OR IGNORE INTO phrase_src(src_id) VALUES(?)", [src_id])
+    cursor.execute(
+        "INSERT OR IGNORE INTO phrase_src(phrase_id, src_id) VALUES(?, ?)",
+        (phrase_id, src_id),
+    )
+
+
+def normalize_phrase(phrase: str) -> str:
+    """
+    Form of a phrase stored for searching and de-duplication
+    """
+    return phrase.lower()
+
+
+def insert_phrase_search(
+    cursor: sqlite3.Cursor,
+    phrase_id: int,
+    phrase: str,
+    source_name: str | None,
+    is_nsfw: bool = False,
+):
+    """
+    Inserts the serving row for a phrase, returns nothing
+    """
+    cursor.execute(
+        "INSERT OR REPLACE INTO phrase_search(phrase_id, phrase_norm, source_name, is_nsfw) VALUES(?, ?, ?, ?)",
+        (phrase_id, normalize_phrase(phrase), source_name, is_nsfw),
+    )
 
 
 def insert_phrase_words(
@@ -391,26 +724,27 @@ def __get_and_normalize(
     return None
 
 
-def import_item(cursor: sqlite3.Cursor, obj: dict):
+def import_item(cursor: sqlite3.Cursor, obj: dict, caches: IdCaches | None = None):
     """
-    Insert the contents of a single word entry into the DB referenced by conn
+    Insert the contents of a single word entry into the DB referenced by conn.
+    Ids are looked up in caches, if given, see IdCaches
     """
     match obj.get("type"):
         case None:
             print("received json with no type field")
         case "word" | "words":
-            import_item_word(cursor, obj)
+            import_item_word(cursor, obj, caches)
         case "assoc" | "word_assoc":
-            import_item_word_assoc(cursor, obj)
+            import_item_word_assoc(cursor, obj, caches)
         case "phrase" | "phrases":
-            import_item_phrase(cursor, obj)
+            import_item_phrase(cursor, obj, caches)
         case "paragraph":
             import_item_paragraph(cursor, obj)
         case _:
             print(f"unrecognized json with type {obj['type']}")
 
 
-def import_item_word(cursor: sqlite3.Cursor, obj: dict):
+def import_item_word(cursor: sqlite3.Cursor, obj: dict, caches: IdCaches | None = None):
     """
     obj schema: {
         type: 'word',
@@ -422,9 +756,9 @@ def import_item_word(cursor: sqlite3.Cursor, obj: dict):
     spellings = __get_and_normalize(("spellings", "spelling"), obj)
     if spellings is None or len(spellings) == 0:
         return
-    insert_spellings(cursor, spellings)
+    insert_spellings(cursor, spellings, caches)
 
-    min_spelling_id = spelling_to_id(cursor, min(spellings))
+    min_spelling_id = spelling_to_id(cursor, min(spellings), caches)
 
     phonetics = __get_and_normalize(("phonetics", "phonetic"), obj)
     if phonetics is not None and len(phonetics) != 0:
@@ -432,11 +766,11 @@ def import_item_word(cursor: sqlite3.Cursor, obj: dict):
 
     source = obj.get("source")
 
-    source_id = insert_source(cursor, source)
+    source_id = insert_source(cursor, source, caches)
     insert_word_source(cursor, min_spelling_id, source_id)
 
 
-def import_item_word_assoc(cursor: sqlite3.Cursor, obj: dict):
+def import_item_word_assoc(cursor: sqlite3.Cursor, obj: dict, caches: IdCaches | None = None):
     """
     obj schema: {
         type: 'word_assoc' or 'assoc'
@@ -451,7 +785,7 @@ def import_item_word_assoc(cursor: sqlite3.Cursor, obj: dict):
     }
     """
     source = obj.get("source")
-    source_id = insert_source(cursor, source)
+    source_id = insert_source(cursor, source, caches)
 
     assocs = obj.get("assocs", obj.get("assoc"))
     if assocs is None or len(assocs) == 0:
@@ -459,15 +793,22 @@ def import_item_word_assoc(cursor: sqlite3.Cursor, obj: dict):
     if isinstance(assocs, dict):
         assocs = (assocs,)
 
+    assocs = [
+        assoc
+        for assoc in assocs
+        if isinstance(assoc, dict) and "word1" in assoc and "word2" in assoc
+    ]
+    ids = spellings_to_ids(
+        cursor, its.chain.from_iterable((assoc["word1"], assoc["word2"]) for assoc in assocs), caches
+    )
     assoc_stream = [
         (
-            spelling_to_id(cursor, assoc["word1"]),
-            spelling_to_id(cursor, assoc["word2"]),
+            ids[assoc["word1"]],
+            ids[assoc["word2"]],
             source_id,
-            assoc_type_to_id(cursor, assoc.get("type", "generic")),
+            assoc_type_to_id(cursor, assoc.get("type", "generic"), caches),
         )
         for assoc in assocs
-        if isinstance(assoc, dict) and "word1" in assoc and "word2" in assoc
     ]
     insert_word_assocs(cursor, assoc_stream)
 
@@ -508,7 +849,7 @@ def alt_phrase_to_words(phrase: str) -> set[str]:
     return words
 
 
-def import_item_phrase(cursor: sqlite3.Cursor, obj: dict):
+def import_item_phrase(cursor: sqlite3.Cursor, obj: dict, caches: IdCaches | None = None):
     """
     obj schema: {
         type: 'phrase',
@@ -521,16 +862,19 @@ def import_item_phrase(cursor: sqlite3.Cursor, obj: dict):
         return
 
     source = obj.get("source")
-    source_id = insert_source(cursor, source)
+    source_id = insert_source(cursor, source, caches)
+    source_name = None if source is None else source.get("name", "")
 
-    for phrase in phrases:
+    phrase_words = obj.get(PREPARED_PHRASE_WORDS)
+    if phrase_words is None:
+        phrase_words = [phrase_to_words(phrase) for phrase in phrases]
+    ids = spellings_to_ids(cursor, its.chain.from_iterable(phrase_words), caches)
+
+    for phrase, words in zip(phrases, phrase_words):
         phrase_id = insert_phrase(cursor, phrase)
-        insert_phrase_words(
-            cursor,
-            phrase_id,
-            (spelling_to_id(cursor, word) for word in phrase_to_words(phrase)),
-        )
+        insert_phrase_words(cursor, phrase_id, (ids[word] for word in words))
         insert_phrase_source(cursor, phrase_id, source_id)
+        insert_phrase_search(cursor, phrase_id, phrase, source_name)
 
 
 def import_item_paragraph(cursor: sqlite3.Cursor, obj: dict):
@@ -539,17 +883,161 @@ def import_item_paragraph(cursor: sqlite3.Cursor, obj: dict):
     """
 
 
-def import_stream(cursor: sqlite3.Cursor, in_stream: Iterable[str]):
+def iter_items(in_stream: Iterable[str]) -> Iterable[dict]:
     """
-    Custom delimiters should be applied via the 'newline' kw-arg when creating the stream.
-
-    :param in_stream: file-like obj where readline() yields a single JSON instance
+    Parses each non-blank line of in_stream as a JSON item
     """
     for line in in_stream:
         if line is None or not line.strip():
             continue
-        item = json.loads(line)
-        import_item(cursor, item)
+        yield json.loads(line)
+
+
+def prepare_item(obj: dict) -> dict:
+    """
+    Does the parts of importing an item that need no DB, ahead of import_item:
+    splits each phrase of a phrase item into words, stored under PREPARED_PHRASE_WORDS.
+    Returns the item
+    """
+    if obj.get("type") in ("phrase", "phrases"):
+        phrases = __get_and_normalize(("phrases", "phrase"), obj)
+        if phrases is not None:
+            obj[PREPARED_PHRASE_WORDS] = [phrase_to_words(phrase) for phrase in phrases]
+    return obj
+
+
+def prepare_lines(lines: list[str]) -> list[dict]:
+    """
+    Parses and prepares a chunk of lines, in a worker process
+    """
+    return [prepare_item(item) for item in iter_items(lines)]
+
+
+def iter_prepared_items(
+    in_stream: Iterable[str],
+    workers: int | None = None,
+    chunk_size: int = DEFAULT_PARALLEL_CHUNK_SIZE,
+    max_pending: int | None = None,
+) -> Iterable[dict]:
+    """
+    Parses and prepares the items of in_stream on a pool of worker processes, yielding them in input order.
+    in_stream is read in chunks of chunk_size lines, and at most max_pending chunks
+    (two per worker by default) are in flight: when the consumer falls behind, reading waits for it.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    lines = iter(in_stream)
+    pending: deque[Future[list[dict]]] = deque()
+    pool = ProcessPoolExecutor(workers)
+    try:
+        while chunk := list(its.islice(lines, chunk_size)):
+            if len(pending) == max_pending:
+                yield from pending.popleft().result()
+            pending.append(pool.submit(prepare_lines, chunk))
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        # on error, or if the consumer stops early, drop the chunks not started yet
+        pool.shutdown(cancel_futures=True)
+
+
+def import_stream(cursor: sqlite3.Cursor, in_stream: Iterable[str], caches: IdCaches | None = None):
+    """
+    Custom delimiters should be applied via the 'newline' kw-arg when creating the stream.
+
+    :param in_stream: file-like obj where readline() yields a single JSON instance
+    """
+    import_items(cursor, iter_items(in_stream), caches)
+
+
+def import_items(cursor: sqlite3.Cursor, items: Iterable[dict], caches: IdCaches | None = None):
+    """
+    Imports already parsed items, see import_item.
+    caches: id caches to use and keep warm across calls, fresh ones for this call if not given
+    """
+    caches = IdCaches() if caches is None else caches
+    for item in items:
+        import_item(cursor, item, caches)
+    bump_generation(cursor)
+
+
+def import_stream_bulk(
+    cursor: sqlite3.Cursor,
+    in_stream: Iterable[str],
+    batch_size: int = DEFAULT_BULK_BATCH_SIZE,
+    caches: IdCaches | None = None,
+) -> int:
+    """
+    Same as import_stream, see import_items_bulk
+    """
+    return import_items_bulk(cursor, iter_items(in_stream), batch_size, caches)
+
+
+def import_stream_parallel(
+    cursor: sqlite3.Cursor,
+    in_stream: Iterable[str],
+    workers: int | None = None,
+    batch_size: int = DEFAULT_BULK_BATCH_SIZE,
+    chunk_size: int = DEFAULT_PARALLEL_CHUNK_SIZE,
+    caches: IdCaches | None = None,
+) -> int:
+    """
+    Same as import_stream_bulk, with JSON parsing and phrase splitting on worker processes
+    (see iter_prepared_items). Only this process writes to the DB.
+    """
+    return import_items_bulk(cursor, iter_prepared_items(in_stream, workers, chunk_size), batch_size, caches)
+
+
+def import_items_bulk(
+    cursor: sqlite3.Cursor,
+    items: Iterable[dict],
+    batch_size: int = DEFAULT_BULK_BATCH_SIZE,
+    caches: IdCaches | None = None,
+) -> int:
+    """
+    Same as import_items, committing every batch_size items in one transaction,
+    with WAL journaling and synchronous=NORMAL for the duration of the load.
+    The connection must be in autocommit mode (isolation_level=None).
+    If an item fails, its batch is rolled back (and caches cleared) and the error re-raised;
+    earlier batches stay committed.
+    Returns the number of items imported.
+    """
+    caches = IdCaches() if caches is None else caches
+    journal_mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+    synchronous = cursor.execute("PRAGMA synchronous").fetchone()[0]
+    cursor.execute("PRAGMA journal_mode = WAL")
+    # WAL with NORMAL only syncs at checkpoints; a crash can lose the last batches, not corrupt the DB
+    cursor.execute("PRAGMA synchronous = NORMAL")
+
+    imported = 0
+    batch_start = 0
+    try:
+        cursor.execute("BEGIN")
+        for item in items:
+            import_item(cursor, item, caches)
+            imported += 1
+            if imported - batch_start == batch_size:
+                # readers see each batch as a new generation
+                bump_generation(cursor)
+                cursor.execute("COMMIT")
+                batch_start = imported
+                cursor.execute("BEGIN")
+        bump_generation(cursor)
+        cursor.execute("COMMIT")
+    except BaseException:
+        if cursor.connection.in_transaction:
+            cursor.execute("ROLLBACK")
+        caches.clear()
+        print(
+            f"rolled back the batch of items {batch_start + 1} to {imported + 1}, "
+            f"{batch_start} items stay imported",
+            file=sys.stderr,
+        )
+        raise
+    finally:
+        cursor.execute(f"PRAGMA synchronous = {int(synchronous)}")
+        cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+    return imported
 
 
 if __name__ == "__main__":
@@ -568,6 +1056,37 @@ if __name__ == "__main__":
         default="\n",
         help="entry separator in stdin. newline by default",
     )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="import in transactions of --batch-size items, with WAL journaling during the load",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BULK_BATCH_SIZE,
+        help="items per transaction with --bulk",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="parse and split phrases on this many processes, importing as with --bulk",
+    )
+    parser.add_argument(
+        "--id-cache-size",
+        type=int,
+        help="most word spelling ids kept in memory, least recently used first out. unbounded by default",
+    )
+    parser.add_argument(
+        "--preload-ids",
+        action="store_true",
+        help="load the ids of existing words, tags and assoc types in one scan before importing",
+    )
+    parser.add_argument(
+        "--rebuild-indexes",
+        action="store_true",
+        help="recompute derived tables (rhyme keys, phrase_search) from existing rows, then exit",
+    )
 
     args = parser.parse_args()
 
@@ -577,8 +1096,26 @@ if __name__ == "__main__":
 
     create_all_tables(cursor)
 
+    if args.rebuild_indexes:
+        cursor.execute("BEGIN")
+        rebuild_rhyme_keys(cursor)
+        rebuild_phrase_search(cursor)
+        bump_generation(cursor)
+        cursor.execute("COMMIT")
+        sys.exit(0)
+
+    caches = IdCaches(args.id_cache_size)
+    if args.preload_ids:
+        caches.preload(cursor)
+
     sys.stdin = io.TextIOWrapper(sys.stdin.buffer, newline=args.sep)
     sys.stdin.reconfigure(newline=args.sep)
     stream = sys.stdin
 
-    import_stream(cursor, stream)
+    if args.workers:
+        import_stream_parallel(cursor, stream, args.workers, args.batch_size, caches=caches)
+    elif args.bulk:
+        import_stream_bulk(cursor, stream, args.batch_size, caches)
+    else:
+        import_stream(cursor, stream, caches)
+    print(f"id cache stats: {json.dumps(caches.stats())}", file=sys.stderr)
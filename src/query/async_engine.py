@@ -0,0 +1,167 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import query_rhymes
+from metrics import METRICS
+from query_engine import QueryEngine
+
+# only needed to await Datamuse without tying up a thread
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+"""
+asyncio front end for QueryEngine, for ASGI servers.
+Datamuse requests are awaited, and the SQLite work runs on a thread pool no larger
+than the engine's connection pool, so any number of in-flight requests share a few threads.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+async def fetch_rhymes_api_async(
+    client: "httpx.AsyncClient",
+    words: list[str],
+    deadline: float = query_rhymes.DEFAULT_API_DEADLINE,
+) -> tuple[dict[str, list[str]], list[str]]:
+    """
+    Async version of query_rhymes.fetch_rhymes_api_concurrently, without the cache.
+    Returns (rhymes by word, words whose fetch failed or missed the deadline (seconds)).
+    """
+
+    async def fetch_one(word: str) -> list[str]:
+        response = await client.get(
+            query_rhymes.API_BASE_URL, params={"rel_rhy": word, "max": 500}, timeout=deadline
+        )
+        response.raise_for_status()
+        return [result["word"] for result in response.json()]
+
+    tasks = {asyncio.ensure_future(fetch_one(word)): word for word in words}
+    if not tasks:
+        return {}, []
+    done, not_done = await asyncio.wait(tasks, timeout=deadline)
+
+    results: dict[str, list[str]] = {}
+    failed: list[str] = []
+    for task in not_done:
+        task.cancel()
+        logger.warning("rhyme fetch for %r missed the deadline", tasks[task])
+        failed.append(tasks[task])
+    for task in done:
+        word = tasks[task]
+        try:
+            results[word] = task.result()
+        except Exception:
+            logger.warning("rhyme fetch for %r failed", word, exc_info=True)
+            failed.append(word)
+    return results, failed
+
+
+class AsyncQueryEngine:
+    """
+    Wraps a QueryEngine. query() (like query_batch() and stream()) runs in three steps:
+    find the words without local rhymes (on the executor), await their Datamuse rhymes,
+    then query with those rhymes (on the executor).
+    Without httpx, Datamuse is called from the executor instead, blocking one of its threads.
+    """
+
+    def __init__(self, engine: QueryEngine, client: "httpx.AsyncClient | None" = None):
+        self.engine = engine
+        # one thread per pooled connection, so executor jobs never wait for a connection
+        self.executor = ThreadPoolExecutor(
+            max_workers=engine.pool_size, thread_name_prefix="sqlite"
+        )
+        if client is None and httpx is not None:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(max_keepalive_connections=query_rhymes.API_MAX_WORKERS)
+            )
+        self.client = client
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Runs a blocking function on the executor
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(function, *args, **kwargs))
+
+    def _cached_rhymes(self, words: list[str]) -> dict[str, list[str]]:
+        cache = self.engine.rhyme_cache
+        if cache is None:
+            return {}
+        cached = {word: cache.get(word) for word in words}
+        return {word: rhymes for word, rhymes in cached.items() if rhymes is not None}
+
+    def _cache_rhymes(self, fetched: dict[str, list[str]]):
+        if self.engine.rhyme_cache is not None:
+            for word, rhymes in fetched.items():
+                self.engine.rhyme_cache.put(word, rhymes)
+
+    async def api_rhymes(self, input: list[str], mode: str) -> tuple[dict[str, list[str]], list[str]]:
+        """
+        Datamuse rhymes of the words of input without local rhymes, from the rhyme cache or awaited.
+        Returns (rhymes by word, words whose fetch failed or missed the deadline).
+        """
+        missing = await self.run(self.engine.words_without_local_rhymes, input, mode)
+        if not missing:
+            return {}, []
+        rhymes = await self.run(self._cached_rhymes, missing)
+        pending = [word for word in missing if word not in rhymes]
+        if not pending:
+            return rhymes, []
+
+        if self.client is not None:
+            with METRICS.time("datamuse"):
+                fetched, failed = await fetch_rhymes_api_async(self.client, pending, self.engine.api_deadline)
+        elif query_rhymes.requests is not None:
+            fetched, failed = await self.run(
+                query_rhymes.fetch_rhymes_api_concurrently, pending, deadline=self.engine.api_deadline
+            )
+        else:
+            fetched, failed = {}, []
+        if fetched:
+            await self.run(self._cache_rhymes, fetched)
+        return {**rhymes, **fetched}, failed
+
+    async def query(self, input: list[str], mode: str = "word", api_fallback: bool = True, **kwargs) -> list[dict]:
+        """
+        Same as QueryEngine.query
+        """
+        api_rhymes, failed = await self.api_rhymes(input, mode) if api_fallback else ({}, [])
+        return await self.run(
+            self.engine.query, input, mode, api_fallback=api_fallback, api_rhymes=api_rhymes,
+            api_complete=not failed, **kwargs
+        )
+
+    async def query_batch(self, inputs: list[str], mode: str = "word", api_fallback: bool = True, **kwargs) -> list[list[dict]]:
+        """
+        Same as QueryEngine.query_batch
+        """
+        api_rhymes, _ = await self.api_rhymes(inputs, mode) if api_fallback else ({}, [])
+        return await self.run(
+            self.engine.query_batch, inputs, mode, api_fallback=api_fallback, api_rhymes=api_rhymes, **kwargs
+        )
+
+    def _read_page(self, *args, **kwargs) -> list[dict]:
+        return list(self.engine.stream(*args, **kwargs))
+
+    async def stream(self, input: list[str], mode: str = "word", api_fallback: bool = True, **kwargs) -> list[dict]:
+        """
+        Same as QueryEngine.stream, except that the page (and the final cursor item)
+        is read on the executor in one go and returned as a list
+        """
+        api_rhymes, _ = await self.api_rhymes(input, mode) if api_fallback else ({}, [])
+        return await self.run(
+            self._read_page, input, mode, api_fallback=api_fallback, api_rhymes=api_rhymes, **kwargs
+        )
+
+    async def load(self):
+        await self.run(self.engine.load)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+        self.executor.shutdown(wait=True)
+        self.engine.close()
@@ -0,0 +1,113 @@
+import argparse
+import os
+import sqlite3 as sql
+from pathlib import Path
+
+"""
+Exports a read-optimized serving snapshot of a DB instance:
+only the tables and indexes the query path reads, vacuumed, analyzed,
+and with a page size tuned for reads.
+The snapshot is written next to its destination and renamed into place,
+so a running QueryEngine(snapshot=True) switches to it atomically.
+"""
+
+# read by query_rhymes, near_rhymes and the lexicon
+SNAPSHOT_TABLES = [
+    "word_spelling",
+    "alt_spelling",
+    "word_phonetic",
+    "word_rhyme",
+    "phrase_words",
+    "phrase_search",
+]
+# copied if present, the query path copes without them
+OPTIONAL_SNAPSHOT_TABLES = [
+    "db_generation",
+]
+
+# larger pages mean fewer, longer reads for the index range scans of the query path
+DEFAULT_PAGE_SIZE = 16384
+
+
+def export_snapshot(src_path: str, dest_path: str, page_size: int = DEFAULT_PAGE_SIZE):
+    """
+    Writes the snapshot of the DB at src_path to dest_path, replacing any previous snapshot
+    """
+    if not os.path.isfile(src_path):
+        raise FileNotFoundError(f"no DB instance at {src_path}")
+    tmp_path = f"{dest_path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sql.connect(tmp_path, isolation_level=None, uri=True)
+    try:
+        # nothing to protect until the snapshot is renamed into place
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(f"PRAGMA page_size = {int(page_size)}")
+        # read-only, so the export never creates or writes to src_path
+        conn.execute("ATTACH DATABASE ? AS src", (Path(src_path).resolve().as_uri() + "?mode=ro",))
+
+        conn.execute("BEGIN")
+        tables = []
+        for table in SNAPSHOT_TABLES + OPTIONAL_SNAPSHOT_TABLES:
+            row = conn.execute(
+                "SELECT sql FROM src.sqlite_master WHERE type = 'table' AND name = ?",
+                (table,),
+            ).fetchone()
+            if row is None:
+                if table in OPTIONAL_SNAPSHOT_TABLES:
+                    continue
+                raise ValueError(
+                    f"{src_path} has no {table} table, run the importer with --rebuild-indexes"
+                )
+            conn.execute(row[0])
+            conn.execute(f"INSERT INTO main.{table} SELECT * FROM src.{table}")
+            tables.append(table)
+
+        # explicit indexes are built after the data is in, which is faster
+        indexes = conn.execute(
+            f"""
+            SELECT sql FROM src.sqlite_master
+            WHERE type = 'index' AND sql IS NOT NULL
+            AND tbl_name IN ({",".join("?" * len(tables))})
+            """,
+            tables,
+        ).fetchall()
+        for (statement,) in indexes:
+            conn.execute(statement)
+        conn.execute("COMMIT")
+        conn.execute("DETACH DATABASE src")
+
+        conn.execute("ANALYZE")
+        conn.execute("VACUUM")
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, dest_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="punDB serving snapshot exporter",
+        description="""
+        Exports the tables the query path reads into an immutable, read-optimized DB instance.
+        An existing snapshot at snapshot_path is replaced atomically.
+        """,
+    )
+    parser.add_argument("db_path", help="path to the DB instance to export")
+    parser.add_argument("snapshot_path", help="path to write the snapshot to")
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help="page size of the snapshot, a power of two between 512 and 65536",
+    )
+
+    args = parser.parse_args()
+    export_snapshot(args.db_path, args.snapshot_path, args.page_size)
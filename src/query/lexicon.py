@@ -0,0 +1,160 @@
+import sqlite3 as sql
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
+
+"""
+Compact in-memory copy of the word tables the query path reads
+(word_spelling, alt_spelling, word_phonetic, word_rhyme).
+Strings are interned and stored once, in sorted lists; everything else is
+kept in flat int arrays searched with bisect, instead of dicts of sets.
+"""
+
+
+class IntMultimap:
+    """
+    Immutable int -> ints mapping, stored as two parallel arrays sorted by key
+    """
+
+    def __init__(self, pairs: Iterable[tuple[int, int]]):
+        pairs = sorted(set(pairs))
+        self.keys = array("q", (key for key, _ in pairs))
+        self.values = array("q", (value for _, value in pairs))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def get(self, key: int) -> array:
+        start = bisect_left(self.keys, key)
+        end = bisect_right(self.keys, key, start)
+        return self.values[start:end]
+
+
+def sorted_strings(strings: Iterable[str]) -> list[str]:
+    """
+    Sorted, deduplicated and interned, so equal strings share one object
+    """
+    return sorted({sys.intern(s) for s in strings})
+
+
+def index_of(strings: list[str], s: str) -> int:
+    """
+    Position of s in the sorted list strings, or -1
+    """
+    i = bisect_left(strings, s)
+    return i if i < len(strings) and strings[i] == s else -1
+
+
+class Lexicon:
+    """
+    Spellings, pronunciations and rhyme keys of all words.
+    Word ids are the word_ids of the DB instance it was loaded from.
+    """
+
+    def __init__(
+        self,
+        spellings: Iterable[tuple[int, str]],
+        alt_spellings: Iterable[tuple[int, int]] = (),
+        phonetics: Iterable[tuple[int, str]] = (),
+        rhyme_keys: Iterable[tuple[int, str]] = (),
+    ):
+        """
+        spellings: (word_id, spelling)*
+        alt_spellings: (word1_id, word2_id)*, word2 being an alternate spelling of word1
+        phonetics: (word_id, phonetic)*
+        rhyme_keys: (word_id, rhyme_key)*
+        """
+        spellings = sorted((sys.intern(spelling), word_id) for word_id, spelling in spellings)
+        self.spellings = [spelling for spelling, _ in spellings]
+        # word_id of each spelling, in spelling order
+        self.word_ids = array("q", (word_id for _, word_id in spellings))
+        # position of each word_id's spelling, in word_id order
+        by_id = sorted(range(len(spellings)), key=self.word_ids.__getitem__)
+        self.sorted_ids = array("q", (self.word_ids[i] for i in by_id))
+        self.spelling_positions = array("q", by_id)
+
+        alt_spellings = list(alt_spellings)
+        self.alts = IntMultimap(alt_spellings)
+        self.alt_of = IntMultimap((word2_id, word1_id) for word1_id, word2_id in alt_spellings)
+
+        phonetics = list(phonetics)
+        self.phonetics = sorted_strings(phonetic for _, phonetic in phonetics)
+        self.phonetics_by_word = IntMultimap(
+            (word_id, index_of(self.phonetics, phonetic)) for word_id, phonetic in phonetics
+        )
+
+        rhyme_keys = list(rhyme_keys)
+        self.rhyme_keys = sorted_strings(rhyme_key for _, rhyme_key in rhyme_keys)
+        key_pairs = [(word_id, index_of(self.rhyme_keys, key)) for word_id, key in rhyme_keys]
+        self.keys_by_word = IntMultimap(key_pairs)
+        self.words_by_key = IntMultimap((key, word_id) for word_id, key in key_pairs)
+
+    @classmethod
+    def from_db(cls, cursor: sql.Cursor) -> "Lexicon":
+        # the rows are consumed before the next statement runs, the cursor is shared
+        return cls(
+            cursor.execute("SELECT word_id, spelling FROM word_spelling").fetchall(),
+            cursor.execute("SELECT word1_id, word2_id FROM alt_spelling").fetchall(),
+            cursor.execute("SELECT word_id, phonetic FROM word_phonetic").fetchall(),
+            cursor.execute("SELECT word_id, rhyme_key FROM word_rhyme").fetchall(),
+        )
+
+    def __len__(self) -> int:
+        return len(self.spellings)
+
+    def __contains__(self, spelling: str) -> bool:
+        return index_of(self.spellings, spelling) != -1
+
+    def word_id(self, spelling: str) -> int | None:
+        i = index_of(self.spellings, spelling)
+        return None if i == -1 else self.word_ids[i]
+
+    def spelling(self, word_id: int) -> str | None:
+        i = bisect_left(self.sorted_ids, word_id)
+        if i == len(self.sorted_ids) or self.sorted_ids[i] != word_id:
+            return None
+        return self.spellings[self.spelling_positions[i]]
+
+    def pronunciations(self, spelling: str) -> list[str]:
+        word_id = self.word_id(spelling)
+        if word_id is None:
+            return []
+        return [self.phonetics[i] for i in self.phonetics_by_word.get(word_id)]
+
+    def rhymes(self, spelling: str) -> set[str]:
+        """
+        Same as query_rhymes.find_rhymes_local: words sharing a rhyme key with spelling,
+        following alternate spellings for both the word and its rhymes
+        """
+        word_id = self.word_id(spelling)
+        if word_id is None:
+            return set()
+        input_ids = {word_id, *self.alt_of.get(word_id)}
+
+        rhyme_ids: set[int] = set()
+        for input_id in input_ids:
+            for key in self.keys_by_word.get(input_id):
+                rhyme_ids.update(self.words_by_key.get(key))
+        rhyme_ids -= input_ids
+
+        all_ids = set(rhyme_ids)
+        for rhyme_id in rhyme_ids:
+            all_ids.update(self.alts.get(rhyme_id))
+
+        rhymes = {self.spelling(i) for i in all_ids}
+        rhymes.discard(None)
+        rhymes.discard(spelling)
+        return rhymes
+
+    def iter_rhyme_keys(self) -> Iterator[tuple[str, str]]:
+        """
+        Yields (rhyme_key, spelling) for all words, including alternate spellings,
+        as NearRhymeIndex takes them
+        """
+        for key_idx, word_id in zip(self.words_by_key.keys, self.words_by_key.values):
+            rhyme_key = self.rhyme_keys[key_idx]
+            for spelling_id in (word_id, *self.alts.get(word_id)):
+                spelling = self.spelling(spelling_id)
+                if spelling is not None:
+                    yield rhyme_key, spelling
@@ -0,0 +1,154 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from collections.abc import Iterator
+
+"""
+Lightweight in-process metrics: per-stage latency histograms and counters,
+rendered in the Prometheus text exposition format.
+Recording is a bisect and a few additions under a lock, cheap enough to leave on.
+"""
+
+# upper bounds in seconds, from sub-millisecond SQL up to the Datamuse deadline
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+PREFIX = "pungent"
+
+# name -> (type, help) of the metrics recorded by the query path
+DESCRIPTIONS = {
+    "stage_seconds": ("histogram", "Time spent in each stage of a query"),
+    "request_seconds": ("histogram", "Time to answer each HTTP route, until the body starts streaming"),
+    "sql_rows_read_total": ("counter", "Rows read from the phrase query, before ranking"),
+    "rows_returned_total": ("counter", "Results returned to callers, after ranking"),
+    "response_cache_hits_total": ("counter", "Responses served from the response cache"),
+    "response_cache_misses_total": ("counter", "Responses not found in the response cache"),
+    "rhyme_cache_memory_hits_total": ("counter", "Datamuse rhymes found in the memory tier"),
+    "rhyme_cache_disk_hits_total": ("counter", "Datamuse rhymes found in the disk tier"),
+    "rhyme_cache_misses_total": ("counter", "Datamuse rhymes not cached"),
+}
+
+
+def format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Observation counts per bucket (upper bounds, plus +Inf), with their sum
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Caller holds the lock of the Metrics it belongs to"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Registry of labelled histograms and counters
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms: dict[tuple[str, tuple], Histogram] = {}
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._lock = threading.Lock()
+
+    def _observe(self, key: tuple[str, tuple], value: float):
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def observe(self, name: str, value: float, **labels: str):
+        self._observe((name, tuple(sorted(labels.items()))), value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe_stage(self, stage: str, seconds: float):
+        # the hot path, skips sorting labels
+        self._observe(("stage_seconds", (("stage", stage),)), seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """
+        Records the duration of the with-block as stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self, counters: dict[str, float] = {}) -> str:
+        """
+        All metrics in the Prometheus text format.
+        counters: unlabelled counters kept elsewhere (e.g. cache stats), by name
+        """
+        with self._lock:
+            histograms = {
+                key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()
+            }
+            all_counters = dict(self._counters)
+        for name, value in counters.items():
+            all_counters[(name, ())] = value
+
+        by_name: dict[str, list[str]] = {}
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            lines = by_name.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(
+                    f"{PREFIX}_{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}"
+                )
+            lines.append(f"{PREFIX}_{name}_sum{format_labels(labels)} {format_value(total)}")
+            lines.append(f"{PREFIX}_{name}_count{format_labels(labels)} {count}")
+        for (name, labels), value in sorted(all_counters.items()):
+            by_name.setdefault(name, []).append(
+                f"{PREFIX}_{name}{format_labels(labels)} {format_value(value)}"
+            )
+
+        output = []
+        for name, lines in by_name.items():
+            kind, help = DESCRIPTIONS.get(name, ("untyped", name))
+            # text format 0.0.4: counters are declared under their full name, _total included
+            output.append(f"# HELP {PREFIX}_{name} {help}")
+            output.append(f"# TYPE {PREFIX}_{name} {kind}")
+            output.extend(lines)
+        return "\n".join(output) + "\n"
+
+
+# shared by everything in the process
+METRICS = Metrics()
@@ -0,0 +1,235 @@
+import sqlite3 as sql
+import threading
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator, Sequence
+
+"""
+Near-rhyme (slant rhyme) search.
+Rhyme keys (see importer_json_to_sqlite.phonetic_to_rhyme_key) are split into phonemes.
+Radius 1, the default, is answered from buckets of single-phoneme deletions built at load time,
+a handful of dict lookups per key. Larger radii search BK-trees under phoneme edit distance,
+which prune much of the lexicon but still visit a large part of it when keys are diverse.
+"""
+
+# joins the phonemes on either side of it, e.g. t͡ʃ
+TIE_BARS = frozenset("͜͡")
+
+DEFAULT_RADIUS = 1
+
+# near-rhyme results remembered per index, for repeated inputs
+DEFAULT_CACHE_SIZE = 4096
+
+
+def ipa_to_phonemes(ipa: str) -> tuple[str, ...]:
+    """
+    Splits IPA into phonemes. Diacritics and modifier letters (e.g. ː, ʰ)
+    stay attached to the symbol before them; tie bars join their neighbours.
+    Stress marks and syllable separators are dropped.
+    """
+    phonemes: list[str] = []
+    join_next = False
+    for c in ipa:
+        if c in ".ˈˌ' /[]":
+            continue
+        if c in TIE_BARS:
+            if phonemes:
+                phonemes[-1] += c
+                join_next = True
+            continue
+        attaches = unicodedata.combining(c) != 0 or unicodedata.category(c) == "Lm"
+        if phonemes and (attaches or join_next):
+            phonemes[-1] += c
+        else:
+            phonemes.append(c)
+        join_next = False
+    return tuple(phonemes)
+
+
+def deletion_variants(key: str) -> Iterator[str]:
+    """
+    key itself, then key with each one of its phonemes (chars) deleted
+    """
+    yield key
+    for i in range(len(key)):
+        yield key[:i] + key[i + 1:]
+
+
+def phoneme_distance(a: Sequence[str], b: Sequence[str]) -> int:
+    """
+    Levenshtein distance over phonemes
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, pa in enumerate(a, 1):
+        current = [i]
+        for j, pb in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (pa != pb),
+                )
+            )
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree of phoneme sequences (tuples, or strings with one char per phoneme).
+    Each node's children are keyed by their distance to the node, so by the
+    triangle inequality a radius query only descends into children whose key
+    is within radius of the query's distance to the node.
+    """
+
+    def __init__(self):
+        # node: (phonemes, {distance: child node})
+        self._root: tuple[Sequence[str], dict] | None = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, item: Sequence[str]):
+        if self._root is None:
+            self._root = (item, {})
+            self._size = 1
+            return
+        node = self._root
+        while True:
+            distance = phoneme_distance(item, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (item, {})
+                self._size += 1
+                return
+            node = child
+
+    def search(self, item: Sequence[str], radius: int) -> Iterator[tuple[Sequence[str], int]]:
+        """
+        Yields (phonemes, distance) for every item within radius of item
+        """
+        if self._root is None:
+            return
+        stack = [self._root]
+        while stack:
+            phonemes, children = stack.pop()
+            distance = phoneme_distance(item, phonemes)
+            if distance <= radius:
+                yield phonemes, distance
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+
+
+class NearRhymeIndex:
+    """
+    In-memory index from spellings to near rhymes, built from word_rhyme.
+    Each distinct phoneme is encoded as a single character, so keys are plain strings.
+    Keys are split into one BK-tree per length: a key can only be within radius
+    of keys whose length differs by at most radius, so the other trees are skipped.
+    For radius 1, keys are also bucketed under their deletion variants: two keys one edit apart
+    share a variant (the shorter key, or both minus the substituted phoneme), so the keys
+    in the query key's buckets, checked for distance, are exactly its radius-1 neighbours.
+    """
+
+    def __init__(self, rhymes: Iterable[tuple[str, str]], cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+        rhymes: (rhyme_key, spelling)*
+        """
+        self.trees: dict[int, BKTree] = {}
+        self.cache_size = cache_size
+        self._codes: dict[str, str] = {}
+        self._spellings_by_key: dict[str, set[str]] = {}
+        self._keys_by_spelling: dict[str, set[str]] = {}
+        # deletion variant -> keys it is a variant of
+        self._keys_by_deletion: dict[str, list[str]] = {}
+        self._cache: OrderedDict[tuple[str, int], frozenset[str]] = OrderedDict()
+        self._lock = threading.Lock()
+        for rhyme_key, spelling in rhymes:
+            key = self._encode(ipa_to_phonemes(rhyme_key))
+            if key not in self._spellings_by_key:
+                self._spellings_by_key[key] = set()
+                self.trees.setdefault(len(key), BKTree()).add(key)
+                for variant in set(deletion_variants(key)):
+                    self._keys_by_deletion.setdefault(variant, []).append(key)
+            self._spellings_by_key[key].add(spelling)
+            self._keys_by_spelling.setdefault(spelling, set()).add(key)
+
+    def _encode(self, phonemes: tuple[str, ...]) -> str:
+        chars = []
+        for phoneme in phonemes:
+            code = self._codes.get(phoneme)
+            if code is None:
+                # private use area, won't collide with anything meaningful
+                code = chr(0xF0000 + len(self._codes))
+                self._codes[phoneme] = code
+            chars.append(code)
+        return "".join(chars)
+
+    @classmethod
+    def from_db(cls, cursor: sql.Cursor) -> "NearRhymeIndex":
+        """
+        Loads the rhyme keys of all words, including alternate spellings
+        """
+        rows = cursor.execute(
+            """
+            SELECT r.rhyme_key, ws.spelling
+            FROM word_rhyme r
+            JOIN word_spelling ws ON ws.word_id = r.word_id
+            UNION
+            SELECT r.rhyme_key, ws.spelling
+            FROM word_rhyme r
+            JOIN alt_spelling a ON a.word1_id = r.word_id
+            JOIN word_spelling ws ON ws.word_id = a.word2_id
+            """
+        )
+        return cls(rows)
+
+    def _near_keys(self, key: str, radius: int) -> frozenset[str]:
+        """
+        Keys within radius of key, memoized
+        """
+        with self._lock:
+            cached = self._cache.get((key, radius))
+            if cached is not None:
+                self._cache.move_to_end((key, radius))
+                return cached
+
+        found = set()
+        if radius == 1:
+            for variant in deletion_variants(key):
+                found.update(self._keys_by_deletion.get(variant, ()))
+            found = {near_key for near_key in found if phoneme_distance(key, near_key) <= 1}
+        else:
+            for length in range(max(0, len(key) - radius), len(key) + radius + 1):
+                tree = self.trees.get(length)
+                if tree is not None:
+                    found.update(near_key for near_key, _ in tree.search(key, radius))
+        found = frozenset(found)
+
+        with self._lock:
+            self._cache[(key, radius)] = found
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return found
+
+    def near_rhymes(self, spelling: str, radius: int = DEFAULT_RADIUS) -> set[str]:
+        """
+        Spellings whose rhyme key is between 1 and radius phoneme edits away
+        from one of the rhyme keys of spelling. Exact rhymes are not included.
+        """
+        own_keys = self._keys_by_spelling.get(spelling, set())
+        found: set[str] = set()
+        for own_key in own_keys:
+            for key in self._near_keys(own_key, radius):
+                if key not in own_keys:
+                    found.update(self._spellings_by_key[key])
+        found.discard(spelling)
+        return found
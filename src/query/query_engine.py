@@ -0,0 +1,568 @@
+import os
+import queue
+import threading
+import sqlite3 as sql
+from collections import OrderedDict
+from contextlib import contextmanager
+from collections.abc import Callable, Hashable, Iterator
+from pathlib import Path
+
+import query_rhymes
+from lexicon import Lexicon
+from metrics import METRICS
+from near_rhymes import NearRhymeIndex, DEFAULT_RADIUS
+from rhyme_cache import RhymeCache
+
+"""
+Long-lived, in-process query service.
+Meant to be created once (e.g. by the Flask server) and shared between requests,
+instead of starting a query_rhymes.py interpreter per request.
+"""
+
+# number of prepared statements sqlite3 keeps per connection
+CACHED_STATEMENTS = 256
+
+# bytes of the DB file each connection memory-maps, so reads come straight from the page cache
+DEFAULT_MMAP_SIZE = 1 << 30
+
+DEFAULT_RESPONSE_CACHE_SIZE = 1024
+
+# results per page when streaming
+DEFAULT_PAGE_SIZE = 50
+
+# results kept by the ranking stage
+DEFAULT_TOP_K = 20
+
+
+def db_generation(cursor: sql.Cursor) -> int:
+    """
+    Returns the DB generation, which writers (the importer, query_nsfw_phrases) bump.
+    DBs that were never bumped are generation 0.
+    """
+    try:
+        row = cursor.execute(
+            "SELECT generation FROM db_generation WHERE id = 0"
+        ).fetchone()
+    except sql.OperationalError:
+        # created before db_generation existed
+        return 0
+    return 0 if row is None else row[0]
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of full query responses.
+    All entries belong to a single data version (see QueryEngine.data_version),
+    and are dropped as soon as a different one is seen.
+    Cached responses are shared, callers must not modify them.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_RESPONSE_CACHE_SIZE):
+        self.max_size = max_size
+        self.generation: Hashable | None = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, list[dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_generation(self, generation: Hashable):
+        """Caller holds the lock"""
+        if generation != self.generation:
+            self._entries.clear()
+            self.generation = generation
+
+    def get(self, key: Hashable, generation: Hashable) -> list[dict] | None:
+        with self._lock:
+            self._check_generation(generation)
+            response = self._entries.get(key)
+            if response is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def put(self, key: Hashable, generation: Hashable, response: list[dict]):
+        with self._lock:
+            self._check_generation(generation)
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+class QueryEngine:
+    """
+    Holds a pool of read-only connections to a DB instance.
+    Connections are opened lazily, up to pool_size, and reused between calls,
+    so their prepared statement caches stay warm.
+    Datamuse responses are cached in rhyme_cache, if given.
+    Full responses are cached in response_cache, if given.
+    Datamuse fetches for all words of a request run concurrently, for at most api_deadline seconds.
+    If a ranker is given (any object with a top_k(results, k, per_source_limit) method, e.g. rank_puns.PunRanker),
+    query and query_batch only return the top_k best results, best first.
+    The per-source limit is then left to the ranker, so each source keeps its best results
+    rather than its first ones.
+    With match="near", rhymes within near_radius phoneme edits are included too,
+    using an in-memory index built on first use and rebuilt when the data version changes.
+    With use_lexicon=True, rhymes are resolved from an in-memory lexicon.Lexicon,
+    managed the same way; load() builds it (and the near-rhyme index) up front.
+
+    With snapshot=True, db_path is a serving snapshot (see export_serving_snapshot.py).
+    It is opened as immutable, which skips all locking, and connections to a snapshot
+    that was since replaced at db_path are reopened when next checked out.
+    The data version of a snapshot includes its file, so a rebuilt snapshot whose
+    DB generation starts over never serves the in-memory structures or responses of the old one.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        pool_size: int = 4,
+        rhyme_cache: RhymeCache | None = None,
+        response_cache: ResponseCache | None = None,
+        api_deadline: float = query_rhymes.DEFAULT_API_DEADLINE,
+        ranker=None,
+        top_k: int = DEFAULT_TOP_K,
+        near_radius: int = DEFAULT_RADIUS,
+        snapshot: bool = False,
+        mmap_size: int = DEFAULT_MMAP_SIZE,
+        use_lexicon: bool = False,
+    ):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.rhyme_cache = rhyme_cache
+        self.response_cache = response_cache
+        self.api_deadline = api_deadline
+        self.ranker = ranker
+        self.top_k = top_k
+        self.near_radius = near_radius
+        self.snapshot = snapshot
+        self.mmap_size = mmap_size
+        # connection -> (st_dev, st_ino, st_mtime_ns) of the snapshot file it was opened on
+        self._file_ids: dict[sql.Connection, tuple[int, int, int]] = {}
+        self.use_lexicon = use_lexicon
+        # name -> (data version, structure built from it)
+        self._in_memory: dict[str, tuple[int, object]] = {}
+        # name -> lock held while that structure is built
+        self._build_locks: dict[str, threading.Lock] = {}
+        self._idle: queue.LifoQueue[sql.Connection] = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _file_id(self) -> tuple[int, int, int]:
+        """
+        Identifies the file at db_path. The mtime tells a new snapshot apart
+        from an old one whose inode number was recycled.
+        """
+        stat = os.stat(self.db_path)
+        return stat.st_dev, stat.st_ino, stat.st_mtime_ns
+
+    def _connect(self) -> sql.Connection:
+        uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        if self.snapshot:
+            file_id = self._file_id()
+            uri += "&immutable=1"
+        conn = sql.connect(
+            uri,
+            uri=True,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+        )
+        conn.execute("PRAGMA query_only = 1")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        if self.snapshot:
+            with self._lock:
+                self._file_ids[conn] = file_id
+        return conn
+
+    def _is_stale(self, conn: sql.Connection) -> bool:
+        """
+        Whether conn was opened on a snapshot that has since been replaced
+        """
+        if not self.snapshot:
+            return False
+        with self._lock:
+            file_id = self._file_ids.get(conn)
+        return file_id != self._file_id()
+
+    def _discard(self, conn: sql.Connection):
+        conn.close()
+        with self._lock:
+            self._file_ids.pop(conn, None)
+            self._opened -= 1
+
+    def _acquire(self) -> sql.Connection:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if not self._is_stale(conn):
+                return conn
+            self._discard(conn)
+
+        with self._lock:
+            can_open = self._opened < self.pool_size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        # pool exhausted, wait for a connection to be returned
+        conn = self._idle.get()
+        if self._is_stale(conn):
+            self._discard(conn)
+            return self._acquire()
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sql.Connection]:
+        """
+        Checks a connection out of the pool for the duration of the with-block
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def data_version(self, cursor: sql.Cursor) -> tuple:
+        """
+        Identifies the data cursor reads: the snapshot file its connection was opened on
+        (None for a live DB), and the DB generation
+        """
+        with self._lock:
+            file_id = self._file_ids.get(cursor.connection)
+        return file_id, db_generation(cursor)
+
+    def _for_generation(self, cursor: sql.Cursor, name: str, build: Callable[[], object]):
+        """
+        The in-memory structure called name, built for the current data version.
+        Builds are single-flight per name: requests arriving during a rebuild wait for it,
+        rather than each building their own copy.
+        """
+        version = self.data_version(cursor)
+        with self._lock:
+            entry = self._in_memory.get(name)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            build_lock = self._build_locks.setdefault(name, threading.Lock())
+        with build_lock:
+            # whoever held the lock may have built it for this version already
+            with self._lock:
+                entry = self._in_memory.get(name)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            built = build()
+            with self._lock:
+                self._in_memory[name] = (version, built)
+            return built
+
+    def _get_lexicon(self, cursor: sql.Cursor) -> Lexicon | None:
+        if not self.use_lexicon:
+            return None
+        return self._for_generation(cursor, "lexicon", lambda: Lexicon.from_db(cursor))
+
+    def _get_near_index(self, cursor: sql.Cursor, match: str) -> NearRhymeIndex | None:
+        """
+        The near-rhyme index for the current data version, or None if match is exact
+        """
+        if match != "near":
+            return None
+
+        def build() -> NearRhymeIndex:
+            lexicon = self._get_lexicon(cursor)
+            if lexicon is None:
+                return NearRhymeIndex.from_db(cursor)
+            return NearRhymeIndex(lexicon.iter_rhyme_keys())
+
+        return self._for_generation(cursor, "near_index", build)
+
+    def load(self):
+        """
+        Builds the in-memory structures now instead of on first use, e.g. at server startup
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._get_lexicon(cursor)
+                self._get_near_index(cursor, "near")
+            finally:
+                cursor.close()
+
+    def _candidate_limit(self, per_source_limit: int) -> int:
+        """
+        per_source_limit of candidate generation: with a ranker, all candidates are generated
+        and the ranker applies per_source_limit by score
+        """
+        return per_source_limit if self.ranker is None else query_rhymes.NO_PER_SOURCE_LIMIT
+
+    def _rank(self, results: list[dict], top_k: int | None, per_source_limit: int) -> list[dict]:
+        """
+        Ranking stage, run after candidate generation
+        """
+        if self.ranker is None:
+            return results
+        with METRICS.time("rank"):
+            return self.ranker.top_k(results, self.top_k if top_k is None else top_k, per_source_limit)
+
+    def words_without_local_rhymes(self, input: list[str], mode: str = "word") -> list[str]:
+        """
+        Words of input the local index has no rhymes for, which query would ask Datamuse about
+        """
+        words = [word.strip().lower() for word in query_rhymes.input_to_words(input, mode)]
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                return query_rhymes.words_without_local_rhymes(
+                    cursor, words, lexicon=self._get_lexicon(cursor)
+                )
+            finally:
+                cursor.close()
+
+    def query(
+        self,
+        input: list[str],
+        mode: str = "word",
+        filters: list[str] = [],
+        nsfw_enabled: bool = False,
+        api_fallback: bool = True,
+        per_source_limit: int = query_rhymes.DEFAULT_PER_SOURCE_LIMIT,
+        top_k: int | None = None,
+        match: str = "exact",
+        api_rhymes: dict[str, list[str]] | None = None,
+        api_complete: bool = True,
+    ) -> list[dict]:
+        """
+        Same as query_rhymes.find_rhymes, using a pooled connection.
+        Served from the response cache when the same request was answered
+        for the current data version.
+        Results are not cached when a Datamuse fetch failed or missed the deadline,
+        so the next request asks again. Callers passing api_rhymes set api_complete
+        to False when some of them could not be fetched.
+        """
+        key = (
+            tuple(word.strip().lower() for word in input),
+            mode,
+            tuple(sorted(set(filters))),
+            bool(nsfw_enabled),
+            bool(api_fallback),
+            per_source_limit,
+            top_k,
+            match,
+        )
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if self.response_cache is not None:
+                    version = self.data_version(cursor)
+                    cached = self.response_cache.get(key, version)
+                    if cached is not None:
+                        METRICS.inc("rows_returned_total", len(cached))
+                        return cached
+
+                lexicon = self._get_lexicon(cursor)
+                local_rhymes = None
+                # Datamuse is asked here rather than in find_rhymes, to learn whether every fetch succeeded.
+                # The local rhymes resolved to find the words to ask about are passed on, not resolved again
+                if api_fallback and api_rhymes is None and query_rhymes.requests is not None:
+                    local_rhymes = query_rhymes.local_rhymes_by_word(
+                        cursor, query_rhymes.input_to_words(list(key[0]), mode), lexicon=lexicon
+                    )
+                    missing = [word for word, rhymes in local_rhymes.items() if not rhymes]
+                    api_rhymes, failed = query_rhymes.fetch_rhymes_api_concurrently(
+                        missing, rhyme_cache=self.rhyme_cache, deadline=self.api_deadline
+                    )
+                    api_complete = not failed
+
+                results = query_rhymes.find_rhymes(
+                    cursor,
+                    list(key[0]),
+                    mode,
+                    filters,
+                    nsfw_enabled,
+                    api_fallback=api_fallback,
+                    rhyme_cache=self.rhyme_cache,
+                    per_source_limit=self._candidate_limit(per_source_limit),
+                    api_deadline=self.api_deadline,
+                    near_index=self._get_near_index(cursor, match),
+                    near_radius=self.near_radius,
+                    lexicon=lexicon,
+                    api_rhymes=api_rhymes,
+                    local_rhymes=local_rhymes,
+                )
+            finally:
+                cursor.close()
+
+        results = self._rank(results, top_k, per_source_limit)
+
+        if self.response_cache is not None and api_complete:
+            self.response_cache.put(key, version, results)
+        METRICS.inc("rows_returned_total", len(results))
+        return results
+
+    def query_batch(
+        self,
+        inputs: list[str],
+        mode: str = "word",
+        filters: list[str] = [],
+        nsfw_enabled: bool = False,
+        api_fallback: bool = True,
+        per_source_limit: int = query_rhymes.DEFAULT_PER_SOURCE_LIMIT,
+        top_k: int | None = None,
+        match: str = "exact",
+        api_rhymes: dict[str, list[str]] | None = None,
+    ) -> list[list[dict]]:
+        """
+        Same as query_rhymes.find_rhymes_batch, using a pooled connection.
+        Results are listed in the same order as inputs.
+        """
+        inputs = [input.strip().lower() for input in inputs]
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                batch = query_rhymes.find_rhymes_batch(
+                    cursor,
+                    inputs,
+                    mode,
+                    filters,
+                    nsfw_enabled,
+                    api_fallback=api_fallback,
+                    rhyme_cache=self.rhyme_cache,
+                    per_source_limit=self._candidate_limit(per_source_limit),
+                    api_deadline=self.api_deadline,
+                    near_index=self._get_near_index(cursor, match),
+                    near_radius=self.near_radius,
+                    lexicon=self._get_lexicon(cursor),
+                    api_rhymes=api_rhymes,
+                )
+            finally:
+                cursor.close()
+        ranked = [self._rank(results, top_k, per_source_limit) for results in batch]
+        METRICS.inc("rows_returned_total", sum(len(results) for results in ranked))
+        return ranked
+
+    def stream(
+        self,
+        input: list[str],
+        mode: str = "word",
+        filters: list[str] = [],
+        nsfw_enabled: bool = False,
+        api_fallback: bool = True,
+        per_source_limit: int = query_rhymes.DEFAULT_PER_SOURCE_LIMIT,
+        after: str | None = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        match: str = "exact",
+        api_rhymes: dict[str, list[str]] | None = None,
+    ) -> Iterator[dict]:
+        """
+        Returns an iterator over one page of results, yielded as they are read, then a final {"cursor": ...} item.
+        Results are not ranked, they come in the same order as from query without a ranker.
+        The cursor is passed back as 'after' to get the next page, and is None on the last page.
+        Rhymes are resolved, and 'after' checked against them, before this returns:
+        ValueError is raised for a malformed cursor, or one made for another query or rhyme set.
+        A connection is checked out while the iterator runs, until it is exhausted or closed.
+        """
+        words = [word.strip().lower() for word in query_rhymes.input_to_words(input, mode)]
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                rhyming_words = query_rhymes.collect_rhyming_words(
+                    cursor,
+                    words,
+                    api_fallback=api_fallback,
+                    rhyme_cache=self.rhyme_cache,
+                    api_deadline=self.api_deadline,
+                    lexicon=self._get_lexicon(cursor),
+                    api_rhymes=api_rhymes,
+                )
+                near_words: set[str] = set()
+                near_index = self._get_near_index(cursor, match)
+                if near_index is not None:
+                    near_words = query_rhymes.collect_near_rhyming_words(
+                        near_index, words, self.near_radius, rhyming_words
+                    )
+            finally:
+                cursor.close()
+
+        if after is not None:
+            fingerprint = query_rhymes.query_fingerprint(
+                words[0], rhyming_words, near_words, filters, nsfw_enabled, per_source_limit
+            )
+            query_rhymes.decode_cursor(after, fingerprint)
+        return self._stream_page(
+            words[0], rhyming_words, near_words, filters, nsfw_enabled, per_source_limit, after, page_size
+        )
+
+    def _stream_page(
+        self,
+        input_word: str,
+        rhyming_words: set[str],
+        near_words: set[str],
+        filters: list[str],
+        nsfw_enabled: bool,
+        per_source_limit: int,
+        after: str | None,
+        page_size: int,
+    ) -> Iterator[dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # one extra row tells whether there is a next page
+                rows = query_rhymes.iter_rhyming_phrases(
+                    cursor,
+                    input_word,
+                    rhyming_words,
+                    filters,
+                    nsfw_enabled,
+                    per_source_limit=per_source_limit,
+                    after=after,
+                    page_size=page_size + 1,
+                    near_words=near_words,
+                )
+                next_cursor = None
+                for i, (result, result_cursor) in enumerate(rows):
+                    if i == page_size:
+                        break
+                    next_cursor = result_cursor
+                    METRICS.inc("rows_returned_total")
+                    yield result
+                else:
+                    next_cursor = None
+            finally:
+                cursor.close()
+        yield {"cursor": next_cursor}
+
+    def stats(self) -> dict[str, int]:
+        """
+        Cache counters, named as in metrics.DESCRIPTIONS
+        """
+        stats = {}
+        if self.response_cache is not None:
+            stats["response_cache_hits_total"] = self.response_cache.hits
+            stats["response_cache_misses_total"] = self.response_cache.misses
+        if self.rhyme_cache is not None:
+            rhyme_stats = self.rhyme_cache.stats()
+            stats["rhyme_cache_memory_hits_total"] = rhyme_stats["memory_hits"]
+            stats["rhyme_cache_disk_hits_total"] = rhyme_stats["disk_hits"]
+            stats["rhyme_cache_misses_total"] = rhyme_stats["misses"]
+        return stats
+
+    def close(self):
+        """
+        Closes the idle connections. Connections currently checked out are left alone
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
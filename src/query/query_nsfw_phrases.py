@@ -1,6 +1,11 @@
+import os
 import sqlite3
+import sys
 from typing import List
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'import'))
+import importer_json_to_sqlite as importer  # noqa: E402
+
 def read_nsfw_words(file_path: str) -> List[str]:
     with open(file_path, "r") as file:
         return [word.strip() for word in file.readlines()]
@@ -8,6 +13,8 @@ def read_nsfw_words(file_path: str) -> List[str]:
 def update_phrases_with_nsfw_words(db_path: str, nsfw_words: List[str]):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
+    # brings older DBs up to the importer's schema, including db_generation and the phrase_search triggers
+    importer.create_all_tables(cursor)
 
     nsfw_word_ids = []
     for word in nsfw_words:
@@ -22,9 +29,13 @@ def update_phrases_with_nsfw_words(db_path: str, nsfw_words: List[str]):
             (word_id,),
         )
 
+    # marks responses cached by query servers as stale
+    importer.bump_generation(cursor)
+
     conn.commit()
     conn.close()
 
+
 def main():
     nsfw_words_file = "data/nsfw_words.txt"
     nsfw_words = read_nsfw_words(nsfw_words_file)
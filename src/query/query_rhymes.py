@@ -1,91 +1,668 @@
 import sqlite3 as sql
 import argparse
-import requests
+import base64
+import binascii
+import hashlib
 import itertools as its
+import logging
+import os
 import re
-from collections.abc import Iterable
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, wait
 import json
+from rhyme_cache import RhymeCache
+from near_rhymes import NearRhymeIndex, DEFAULT_RADIUS
+from lexicon import Lexicon
+from metrics import METRICS
 
-API_BASE_URL = "https://api.datamuse.com/words"
+# only needed for the Datamuse fallback
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
 
+# can be pointed at a stand-in, e.g. test/server/datamuse_stub.py
+API_BASE_URL = os.environ.get("PUNGENT_DATAMUSE_URL", "https://api.datamuse.com/words")
 
-def replace_word(string, word, substitution_word):
-    pattern = re.compile(rf"\b{re.escape(word)}\b", re.IGNORECASE)
-    return pattern.sub(substitution_word, string, count=1)
+# concurrent Datamuse requests (and kept-alive connections) per process
+API_MAX_WORKERS = 8
+# seconds a request waits for all of its Datamuse responses
+DEFAULT_API_DEADLINE = 5.0
 
+logger = logging.getLogger(__name__)
 
-def find_rhymes_api(word: str) -> Iterable[str]:
+# created on first use, shared by all requests of the process
+_api_session = None
+_api_executor = None
+_api_lock = threading.Lock()
+
+
+def get_api_session() -> "requests.Session":
+    """
+    Keep-alive session for Datamuse, so connections (and TLS handshakes) are reused
+    """
+    global _api_session
+    with _api_lock:
+        if _api_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=API_MAX_WORKERS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _api_session = session
+        return _api_session
+
+
+def get_api_executor() -> ThreadPoolExecutor:
+    global _api_executor
+    with _api_lock:
+        if _api_executor is None:
+            _api_executor = ThreadPoolExecutor(
+                max_workers=API_MAX_WORKERS, thread_name_prefix="datamuse"
+            )
+        return _api_executor
+
+
+class RhymeSubstituter:
+    """
+    Substitutes rhyme words in phrases, compiling each rhyme word's pattern
+    only once per request instead of once per result
+    """
+
+    def __init__(self, substitution_word: str, patterns: dict[str, re.Pattern] | None = None):
+        """
+        patterns: compiled patterns to start from and add to,
+        so substituters for different words can share them
+        """
+        self.substitution_word = substitution_word
+        self._patterns: dict[str, re.Pattern] = {} if patterns is None else patterns
+
+    def _pattern(self, word: str) -> re.Pattern:
+        pattern = self._patterns.get(word)
+        if pattern is None:
+            pattern = re.compile(rf"\b{re.escape(word)}\b", re.IGNORECASE)
+            self._patterns[word] = pattern
+        return pattern
+
+    def substitute(self, phrase: str, word: str) -> tuple[str, tuple[int, int] | None]:
+        """
+        Replaces the first whole-word occurrence of word in phrase, in a single pass.
+        Returns the new phrase and the span of the substitution in it,
+        or the unchanged phrase and None if word does not occur.
+        """
+        match = self._pattern(word).search(phrase)
+        if match is None:
+            return phrase, None
+        start = match.start()
+        end = start + len(self.substitution_word)
+        return phrase[:start] + self.substitution_word + phrase[match.end():], (start, end)
+
+
+def find_rhymes_local(cursor: sql.Cursor, word: str) -> Iterable[str]:
+    """
+    Finds rhymes of word using the rhyme keys stored in word_rhyme.
+    Alternate spellings are followed for both the word and its rhymes.
+    """
+    rows = cursor.execute(
+        """
+        WITH input_ids(word_id) AS (
+            SELECT word_id FROM word_spelling WHERE spelling = :word
+            UNION
+            SELECT a.word1_id
+            FROM alt_spelling a
+            JOIN word_spelling ws ON ws.word_id = a.word2_id
+            WHERE ws.spelling = :word
+        ),
+        keys(rhyme_key) AS (
+            SELECT DISTINCT r.rhyme_key
+            FROM word_rhyme r
+            JOIN input_ids i ON i.word_id = r.word_id
+        ),
+        rhyme_ids(word_id) AS (
+            SELECT r.word_id
+            FROM word_rhyme r
+            JOIN keys k ON k.rhyme_key = r.rhyme_key
+            WHERE r.word_id NOT IN (SELECT word_id FROM input_ids)
+        ),
+        all_ids(word_id) AS (
+            SELECT word_id FROM rhyme_ids
+            UNION
+            SELECT a.word2_id
+            FROM alt_spelling a
+            JOIN rhyme_ids r ON r.word_id = a.word1_id
+        )
+        SELECT ws.spelling
+        FROM word_spelling ws
+        JOIN all_ids i ON i.word_id = ws.word_id
+        WHERE ws.spelling != :word
+        """,
+        {"word": word},
+    )
+    return (row[0] for row in rows)
+
+
+def find_rhymes_api(word: str, timeout: float = DEFAULT_API_DEADLINE) -> Iterable[str]:
     params = {
         "rel_rhy": word,
         "max": 500,
     }
-    response = requests.get(API_BASE_URL, params=params)
+    response = get_api_session().get(API_BASE_URL, params=params, timeout=timeout)
     response.raise_for_status()
     return (result["word"] for result in response.json())
 
 
-def find_rhymes(cursor: sql.Cursor, input: list[str], mode: str, filters: list[str], nsfw_enabled: bool) -> Iterable[str]:
-    words: list[str]
+def fetch_rhymes_api_concurrently(
+    words: Iterable[str],
+    *,
+    rhyme_cache: RhymeCache | None = None,
+    deadline: float = DEFAULT_API_DEADLINE,
+    fetch: Callable[..., Iterable[str]] = find_rhymes_api,
+) -> tuple[dict[str, list[str]], list[str]]:
+    """
+    Fetches the rhymes of all words at once, so the wait is that of the slowest word.
+    Cached words are not fetched, fetched ones are added to rhyme_cache.
+    Returns (rhymes by word, failed words): words whose fetch fails or misses
+    the deadline (seconds) are left out of the rhymes and listed as failed,
+    so callers know the rhymes are incomplete.
+    """
+    results: dict[str, list[str]] = {}
+    pending: list[str] = []
+    for word in dict.fromkeys(words):
+        cached = rhyme_cache.get(word) if rhyme_cache is not None else None
+        if cached is not None:
+            results[word] = cached
+        else:
+            pending.append(word)
+    if not pending:
+        return results, []
+
+    start = time.perf_counter()
+
+    def fetch_one(word: str) -> list[str]:
+        rhymes = list(fetch(word, timeout=deadline))
+        if rhyme_cache is not None:
+            rhyme_cache.put(word, rhymes)
+        return rhymes
+
+    executor = get_api_executor()
+    futures = {executor.submit(fetch_one, word): word for word in pending}
+    done, not_done = wait(futures, timeout=deadline)
+
+    failed: list[str] = []
+    for future in not_done:
+        future.cancel()
+        logger.warning("rhyme fetch for %r missed the deadline", futures[future])
+        failed.append(futures[future])
+    for future in done:
+        word = futures[future]
+        try:
+            results[word] = future.result()
+        except Exception:
+            logger.warning("rhyme fetch for %r failed", word, exc_info=True)
+            failed.append(word)
+    METRICS.observe_stage("datamuse", time.perf_counter() - start)
+    return results, failed
+
+
+# phrases containing any of the rhyme words, bound as a single JSON parameter.
+# Phrases are read from phrase_search, the importer's flat serving table.
+# Phrases are de-duplicated case-insensitively (keeping the first one imported),
+# then at most per_source_limit are kept for each source (all of them if it is NO_PER_SOURCE_LIMIT).
+# Rows come in (source_name, phrase_id) order.
+# The statement text never changes, so it stays in the prepared statement cache.
+RHYME_PHRASES_QUERY = """
+    WITH matches AS (
+        SELECT ps.phrase_id, ps.phrase_norm AS phrase, ps.source_name, ws.spelling AS rhyme_word,
+            COUNT(*) OVER (PARTITION BY ws.word_id) AS rhyme_frequency
+        FROM word_spelling ws
+        JOIN phrase_words pw ON pw.word_id = ws.word_id
+        JOIN phrase_search ps ON ps.phrase_id = pw.phrase_id
+        WHERE ws.spelling IN (SELECT value FROM json_each(:rhymes))
+        AND ps.source_name IN (SELECT value FROM json_each(:filters))
+        AND (:nsfw_enabled OR ps.is_nsfw == 0)
+    ),
+    deduped AS (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY phrase ORDER BY phrase_id, rhyme_word) AS phrase_rank
+        FROM matches
+    ),
+    ranked AS (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY source_name ORDER BY phrase_id) AS source_rank
+        FROM deduped
+        WHERE phrase_rank = 1
+    )
+    SELECT phrase, source_name, rhyme_word, rhyme_frequency, phrase_id, source_rank
+    FROM ranked
+    WHERE :per_source_limit < 0 OR source_rank <= :per_source_limit
+    ORDER BY source_name, phrase_id
+"""
+
+# one page of the rows of RHYME_PHRASES_QUERY, in the same order, with the same columns.
+# Pages are keyed on the stored (source_name, phrase_id) of the last row seen (:after_source, :after_phrase_id),
+# and :after_rank is the number of rows of :after_source already seen.
+# Only later matches are de-duplicated and ranked: a match is a duplicate if an earlier phrase
+# (by phrase_id, then rhyme word) has the same phrase_norm, checked through the phrase_search_norm index.
+# rhyme_frequency is only counted for the rhyme words of the page.
+RHYME_PHRASES_PAGE_QUERY = """
+    WITH rhymes(word_id, spelling) AS (
+        SELECT word_id, spelling FROM word_spelling
+        WHERE spelling IN (SELECT value FROM json_each(:rhymes))
+    ),
+    matches AS (
+        SELECT ps.phrase_id, ps.phrase_norm AS phrase, ps.source_name, r.word_id, r.spelling AS rhyme_word
+        FROM rhymes r
+        JOIN phrase_words pw ON pw.word_id = r.word_id
+        JOIN phrase_search ps ON ps.phrase_id = pw.phrase_id
+        WHERE ps.source_name IN (SELECT value FROM json_each(:filters))
+        AND (:nsfw_enabled OR ps.is_nsfw == 0)
+        AND (:after_source IS NULL OR (ps.source_name, ps.phrase_id) > (:after_source, :after_phrase_id))
+    ),
+    deduped AS (
+        SELECT * FROM matches m
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM phrase_search d
+            JOIN phrase_words dw ON dw.phrase_id = d.phrase_id
+            JOIN rhymes dr ON dr.word_id = dw.word_id
+            WHERE d.phrase_norm = m.phrase
+            AND (d.phrase_id < m.phrase_id OR (d.phrase_id = m.phrase_id AND dr.spelling < m.rhyme_word))
+            AND d.source_name IN (SELECT value FROM json_each(:filters))
+            AND (:nsfw_enabled OR d.is_nsfw == 0)
+        )
+    ),
+    ranked AS (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY source_name ORDER BY phrase_id)
+            + IIF(source_name = :after_source, :after_rank, 0) AS source_rank
+        FROM deduped
+    ),
+    page AS (
+        SELECT * FROM ranked
+        WHERE :per_source_limit < 0 OR source_rank <= :per_source_limit
+        ORDER BY source_name, phrase_id
+        LIMIT :page_size
+    ),
+    frequency AS (
+        SELECT pw.word_id, COUNT(*) AS rhyme_frequency
+        FROM phrase_words pw
+        JOIN phrase_search ps ON ps.phrase_id = pw.phrase_id
+        WHERE pw.word_id IN (SELECT word_id FROM page)
+        AND ps.source_name IN (SELECT value FROM json_each(:filters))
+        AND (:nsfw_enabled OR ps.is_nsfw == 0)
+        GROUP BY pw.word_id
+    )
+    SELECT p.phrase, p.source_name, p.rhyme_word, f.rhyme_frequency, p.phrase_id, p.source_rank
+    FROM page p
+    JOIN frequency f ON f.word_id = p.word_id
+    ORDER BY p.source_name, p.phrase_id
+"""
+
+# default number of results per source
+DEFAULT_PER_SOURCE_LIMIT = 10
+# per_source_limit keeping every result, e.g. for a ranker to cap them by score
+NO_PER_SOURCE_LIMIT = -1
+
+
+def query_fingerprint(
+    input_word: str,
+    rhyming_words: set[str],
+    near_words: set[str],
+    filters: list[str],
+    nsfw_enabled: bool,
+    per_source_limit: int,
+) -> str:
+    """
+    Short hash of everything that decides which rows a query pages through
+    """
+    raw = json.dumps([
+        input_word,
+        sorted(rhyming_words),
+        sorted(near_words),
+        sorted(set(filters)),
+        bool(nsfw_enabled),
+        per_source_limit,
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(fingerprint: str, source_name: str, phrase_id: int, source_rank: int) -> str:
+    """
+    Opaque pagination cursor pointing after the given result of the query with the given fingerprint
+    """
+    raw = json.dumps([fingerprint, source_name, phrase_id, source_rank]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, fingerprint: str | None = None) -> tuple[str, int, int]:
+    """
+    Inverse of encode_cursor, returns (source_name, phrase_id, source_rank).
+    Raises ValueError for malformed cursors,
+    and for cursors of a query other than fingerprint (if given), e.g. one whose rhymes have since changed
+    """
+    try:
+        cursor_fingerprint, source_name, phrase_id, source_rank = json.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii"))
+        )
+    except (binascii.Error, UnicodeError, AttributeError, TypeError, ValueError) as e:
+        raise ValueError(f"invalid cursor {cursor!r}") from e
+    if not (
+        isinstance(cursor_fingerprint, str)
+        and isinstance(source_name, str)
+        and isinstance(phrase_id, int)
+        and isinstance(source_rank, int)
+    ):
+        raise ValueError(f"invalid cursor {cursor!r}")
+    if fingerprint is not None and cursor_fingerprint != fingerprint:
+        raise ValueError("cursor belongs to a different query or rhyme set, start again from the first page")
+    return source_name, phrase_id, source_rank
+
+
+def input_to_words(input: list[str], mode: str) -> list[str]:
+    """
+    Interprets the input according to mode, see the --mode CL arg
+    """
+    if mode in ("phrase", "wordblob"):
+        return list(its.chain.from_iterable(item.split() for item in input))
+    return input
+
+
+def local_rhymes_by_word(cursor: sql.Cursor, words: Iterable[str], *, lexicon: Lexicon | None = None) -> dict[str, set[str]]:
+    """
+    Rhymes of each distinct word in the local index, read from lexicon if given, from the DB otherwise
+    """
+    rhymes: dict[str, set[str]] = {}
+    with METRICS.time("local_rhymes"):
+        for word in dict.fromkeys(words):
+            if lexicon is not None:
+                rhymes[word] = lexicon.rhymes(word)
+            else:
+                rhymes[word] = set(find_rhymes_local(cursor, word))
+    return rhymes
+
+
+def rhymes_by_word(cursor: sql.Cursor, words: Iterable[str], *, api_fallback: bool = True, rhyme_cache: RhymeCache | None = None, api_deadline: float = DEFAULT_API_DEADLINE, lexicon: Lexicon | None = None, api_rhymes: dict[str, list[str]] | None = None, local_rhymes: dict[str, set[str]] | None = None) -> dict[str, set[str]]:
+    """
+    Rhymes of each distinct word.
+    The local index is read from lexicon if given, from the DB otherwise,
+    unless the caller already resolved it for all of words into local_rhymes (see local_rhymes_by_word).
+    Words missing from the local index are fetched from Datamuse concurrently,
+    see fetch_rhymes_api_concurrently, unless the caller already fetched them into api_rhymes.
+    """
+    words = list(dict.fromkeys(words))
+    if local_rhymes is None:
+        local_rhymes = local_rhymes_by_word(cursor, words, lexicon=lexicon)
+    # copies, as Datamuse rhymes are added to them
+    rhymes = {word: set(local_rhymes[word]) for word in words}
+    missing = [word for word in words if not rhymes[word]]
+
+    if missing and api_fallback:
+        if api_rhymes is not None:
+            fetched = {word: api_rhymes[word] for word in missing if word in api_rhymes}
+        elif requests is not None:
+            fetched, _ = fetch_rhymes_api_concurrently(missing, rhyme_cache=rhyme_cache, deadline=api_deadline)
+        else:
+            fetched = {}
+        for word, fetched_rhymes in fetched.items():
+            rhymes[word].update(fetched_rhymes)
+    return rhymes
+
+
+def words_without_local_rhymes(cursor: sql.Cursor, words: Iterable[str], *, lexicon: Lexicon | None = None) -> list[str]:
+    """
+    The distinct words the local index has no rhymes for, i.e. those Datamuse would be asked about
+    """
+    missing: list[str] = []
+    for word in dict.fromkeys(words):
+        if lexicon is not None:
+            has_rhymes = bool(lexicon.rhymes(word))
+        else:
+            has_rhymes = next(iter(find_rhymes_local(cursor, word)), None) is not None
+        if not has_rhymes:
+            missing.append(word)
+    return missing
 
-    if mode == "phrase":
-        words = list(its.chain.from_iterable(item.split() for item in input))
-    elif mode == "word": 
-        words = input
-    
-    # for now...
-    input_word = words[0]
 
+def collect_rhyming_words(cursor: sql.Cursor, words: list[str], *, api_fallback: bool = True, rhyme_cache: RhymeCache | None = None, api_deadline: float = DEFAULT_API_DEADLINE, lexicon: Lexicon | None = None, api_rhymes: dict[str, list[str]] | None = None, local_rhymes: dict[str, set[str]] | None = None) -> set[str]:
+    """
+    Union of the rhymes of all words
+    """
     rhyming_words: set[str] = set()
-    for word in words:
-        rhyming_words.update(find_rhymes_api(word))
+    rhymes = rhymes_by_word(
+        cursor, words, api_fallback=api_fallback, rhyme_cache=rhyme_cache, api_deadline=api_deadline,
+        lexicon=lexicon, api_rhymes=api_rhymes, local_rhymes=local_rhymes,
+    )
+    for word_rhymes in rhymes.values():
+        rhyming_words.update(word_rhymes)
+    return rhyming_words
+
 
-    rhyming_phrases: list[dict[str, str]] = []
-    seen_phrases = set()
+# how rhymes are matched: exact (perfect) rhymes only, or near rhymes too
+MATCH_MODES = ("exact", "near")
 
-    query = """
-        SELECT DISTINCT p.phrase, s.name, m.val
-        FROM phrase p
-        JOIN phrase_src ps ON ps.phrase_id = p.phrase_id
-        JOIN source s ON s.src_id = ps.src_id
-        JOIN source_metadata sm ON sm.src_id = s.src_id
-        JOIN metadata m ON m.metadata_id = sm.metadata_id
-        WHERE p.phrase LIKE ?
-        AND s.name IN ({})
-    """.format(",".join("?"*len(filters)))
 
-    if not nsfw_enabled:
-        query += " AND p.is_nsfw == 0"
+def collect_near_rhyming_words(near_index: NearRhymeIndex, words: Iterable[str], radius: int = DEFAULT_RADIUS, exclude: set[str] = set()) -> set[str]:
+    """
+    Union of the near rhymes of all words, leaving out the words in exclude (e.g. the exact rhymes)
+    """
+    near_words: set[str] = set()
+    with METRICS.time("near_rhymes"):
+        for word in words:
+            near_words.update(near_index.near_rhymes(word, radius))
+    return near_words - exclude
 
-    
-    source_counts = {}
-    for rhyme_word in rhyming_words:
-         params = (f"%{rhyme_word}%",) + tuple(filters)
-         for row in cursor.execute(query, params):
-            phrase, source_name, metadata = row
-            phrase = phrase.lower()
 
-            if phrase in seen_phrases:
-                continue
+def make_result(
+    substituter: RhymeSubstituter,
+    phrase: str,
+    source_name: str,
+    rhyme_word: str,
+    rhyme_frequency: int,
+    match: str = "exact",
+) -> dict:
+    """
+    Builds the result for a phrase containing rhyme_word.
+    rhyme_frequency (the number of matching phrases containing rhyme_word)
+    and match (how well rhyme_word rhymes) are used for ranking.
+    """
+    rhymed_phrase, span = substituter.substitute(phrase, rhyme_word)
+    return {
+        "original_phrase": phrase,
+        "rhymed_phrase": rhymed_phrase,
+        # [start, end) of the substituted word in rhymed_phrase, for highlighting
+        "span": None if span is None else list(span),
+        "rhyme_word": rhyme_word,
+        "rhyme_frequency": rhyme_frequency,
+        "match": match,
+        "metadata": {"source": source_name},
+    }
 
-            if source_name not in source_counts:
-                source_counts[source_name] = 0
 
-            if source_counts[source_name] >= 10:
-                continue
+def iter_rhyming_phrases(
+    cursor: sql.Cursor,
+    input_word: str,
+    rhyming_words: set[str],
+    filters: list[str],
+    nsfw_enabled: bool,
+    *,
+    per_source_limit: int = DEFAULT_PER_SOURCE_LIMIT,
+    after: str | None = None,
+    page_size: int | None = None,
+    near_words: set[str] = set(),
+) -> Iterator[tuple[dict, str]]:
+    """
+    Yields each result as soon as its row is read, along with a cursor pointing after it.
+    after: cursor of the last result already seen, if any.
+    Raises ValueError if it is malformed or was made for a different query or rhyme set
+    page_size: maximum number of results, None for all of them
+    near_words: words also searched for, marked as near rhymes in the results
+    """
+    fingerprint = query_fingerprint(
+        input_word, rhyming_words, near_words, filters, nsfw_enabled, per_source_limit
+    )
+    params = {
+        "rhymes": json.dumps(sorted(rhyming_words | near_words)),
+        "filters": json.dumps(filters),
+        "nsfw_enabled": nsfw_enabled,
+        "per_source_limit": per_source_limit,
+    }
+    if after is None and page_size is None:
+        statement = RHYME_PHRASES_QUERY
+    else:
+        statement = RHYME_PHRASES_PAGE_QUERY
+        after_source, after_phrase_id, after_rank = (
+            (None, None, None) if after is None else decode_cursor(after, fingerprint)
+        )
+        params.update({
+            "after_source": after_source,
+            "after_phrase_id": after_phrase_id,
+            "after_rank": after_rank,
+            "page_size": -1 if page_size is None else page_size,
+        })
 
-            metadata = {"source": source_name}
-            rhymed_phrase = replace_word(phrase, rhyme_word, input_word)
+    substituter = RhymeSubstituter(input_word)
+    # only time spent in here is counted, not the time the caller holds on to a result
+    sql_seconds = substitute_seconds = 0.0
+    rows_read = 0
+    try:
+        start = time.perf_counter()
+        rows = cursor.execute(statement, params)
+        while True:
+            row = next(rows, None)
+            read = time.perf_counter()
+            sql_seconds += read - start
+            if row is None:
+                break
+            rows_read += 1
+            phrase, source_name, rhyme_word, rhyme_frequency, phrase_id, source_rank = row
+            match = "near" if rhyme_word in near_words else "exact"
+            result = make_result(substituter, phrase, source_name, rhyme_word, rhyme_frequency, match)
+            substitute_seconds += time.perf_counter() - read
+            yield result, encode_cursor(fingerprint, source_name, phrase_id, source_rank)
+            start = time.perf_counter()
+    finally:
+        METRICS.observe_stage("sql", sql_seconds)
+        METRICS.observe_stage("substitute", substitute_seconds)
+        METRICS.inc("sql_rows_read_total", rows_read)
 
-            rhyming_phrases.append({
-                "original_phrase": phrase,
-                "rhymed_phrase": rhymed_phrase,
-                "metadata": metadata,
-            })
 
-            seen_phrases.add(phrase)
-            source_counts[source_name] += 1
+# batch version of RHYME_PHRASES_QUERY, without pagination.
+# :rhyme_inputs maps each rhyme word to the indices of the inputs it rhymes with.
+# Phrases are looked up once per distinct rhyme word (materialized),
+# then fanned out to the inputs, which are de-duplicated and limited separately.
+RHYME_PHRASES_BATCH_QUERY = """
+    WITH wanted AS (
+        SELECT r.key AS spelling, i.value AS input_idx
+        FROM json_each(:rhyme_inputs) r, json_each(r.value) i
+    ),
+    matches AS MATERIALIZED (
+        SELECT ps.phrase_id, ps.phrase_norm AS phrase, ps.source_name, ws.spelling AS rhyme_word,
+            COUNT(*) OVER (PARTITION BY ws.word_id) AS rhyme_frequency
+        FROM word_spelling ws
+        JOIN phrase_words pw ON pw.word_id = ws.word_id
+        JOIN phrase_search ps ON ps.phrase_id = pw.phrase_id
+        WHERE ws.spelling IN (SELECT key FROM json_each(:rhyme_inputs))
+        AND ps.source_name IN (SELECT value FROM json_each(:filters))
+        AND (:nsfw_enabled OR ps.is_nsfw == 0)
+    ),
+    deduped AS (
+        SELECT w.input_idx, m.*,
+            ROW_NUMBER() OVER (PARTITION BY w.input_idx, m.phrase ORDER BY m.phrase_id, m.rhyme_word) AS phrase_rank
+        FROM matches m
+        JOIN wanted w ON w.spelling = m.rhyme_word
+    ),
+    ranked AS (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY input_idx, source_name ORDER BY phrase_id) AS source_rank
+        FROM deduped
+        WHERE phrase_rank = 1
+    )
+    SELECT input_idx, phrase, source_name, rhyme_word, rhyme_frequency
+    FROM ranked
+    WHERE :per_source_limit < 0 OR source_rank <= :per_source_limit
+    ORDER BY input_idx, source_name, source_rank
+"""
+
+
+def find_rhymes_batch(cursor: sql.Cursor, inputs: list[str], mode: str, filters: list[str], nsfw_enabled: bool, *, api_fallback: bool = True, rhyme_cache: RhymeCache | None = None, per_source_limit: int = DEFAULT_PER_SOURCE_LIMIT, api_deadline: float = DEFAULT_API_DEADLINE, near_index: NearRhymeIndex | None = None, near_radius: int = DEFAULT_RADIUS, lexicon: Lexicon | None = None, api_rhymes: dict[str, list[str]] | None = None, local_rhymes: dict[str, set[str]] | None = None) -> list[list[dict]]:
+    """
+    find_rhymes for each of the inputs, returned in the same order.
+    Rhymes are resolved once per distinct word, and phrases looked up once per
+    distinct rhyme word, so the work grows with the distinct rhymes, not the inputs.
+    Near rhymes are included when near_index is given.
+    Rhymes are looked up in lexicon instead of the DB when it is given.
+    api_rhymes: Datamuse rhymes already fetched by the caller, Datamuse is not called when given
+    local_rhymes: local rhymes already resolved by the caller, for all words of the inputs
+    """
+    input_words = [input_to_words([input], mode) for input in inputs]
+    rhymes = rhymes_by_word(
+        cursor, its.chain.from_iterable(input_words), api_fallback=api_fallback, rhyme_cache=rhyme_cache,
+        api_deadline=api_deadline, lexicon=lexicon, api_rhymes=api_rhymes, local_rhymes=local_rhymes,
+    )
+
+    rhyme_inputs: dict[str, list[int]] = {}
+    input_near_words: list[set[str]] = []
+    for i, words in enumerate(input_words):
+        input_rhymes = set(its.chain.from_iterable(rhymes[word] for word in words))
+        near_words: set[str] = set()
+        if near_index is not None:
+            near_words = collect_near_rhyming_words(near_index, words, near_radius, input_rhymes)
+        input_near_words.append(near_words)
+        for rhyme in input_rhymes | near_words:
+            rhyme_inputs.setdefault(rhyme, []).append(i)
+
+    params = {
+        "rhyme_inputs": json.dumps(rhyme_inputs),
+        "filters": json.dumps(filters),
+        "nsfw_enabled": nsfw_enabled,
+        "per_source_limit": per_source_limit,
+    }
+
+    results: list[list[dict]] = [[] for _ in inputs]
+    patterns: dict[str, re.Pattern] = {}
+    substituters = [
+        RhymeSubstituter(words[0], patterns) if words else None for words in input_words
+    ]
+    start = time.perf_counter()
+    rows = cursor.execute(RHYME_PHRASES_BATCH_QUERY, params).fetchall()
+    METRICS.observe_stage("sql", time.perf_counter() - start)
+    METRICS.inc("sql_rows_read_total", len(rows))
+
+    with METRICS.time("substitute"):
+        for input_idx, phrase, source_name, rhyme_word, rhyme_frequency in rows:
+            match = "near" if rhyme_word in input_near_words[input_idx] else "exact"
+            results[input_idx].append(
+                make_result(substituters[input_idx], phrase, source_name, rhyme_word, rhyme_frequency, match)
+            )
+    return results
+
+
+def find_rhymes(cursor: sql.Cursor, input: list[str], mode: str, filters: list[str], nsfw_enabled: bool, *, api_fallback: bool = True, rhyme_cache: RhymeCache | None = None, per_source_limit: int = DEFAULT_PER_SOURCE_LIMIT, api_deadline: float = DEFAULT_API_DEADLINE, near_index: NearRhymeIndex | None = None, near_radius: int = DEFAULT_RADIUS, lexicon: Lexicon | None = None, api_rhymes: dict[str, list[str]] | None = None, local_rhymes: dict[str, set[str]] | None = None) -> list[dict]:
+    """
+    Near rhymes (within near_radius phoneme edits) are included when near_index is given.
+    Rhymes are looked up in lexicon instead of the DB when it is given.
+    api_rhymes: Datamuse rhymes already fetched by the caller, Datamuse is not called when given
+    local_rhymes: local rhymes already resolved by the caller, for all words of input
+    """
+    words = input_to_words(input, mode)
+
+    # for now...
+    input_word = words[0]
+
+    rhyming_words = collect_rhyming_words(
+        cursor, words, api_fallback=api_fallback, rhyme_cache=rhyme_cache, api_deadline=api_deadline,
+        lexicon=lexicon, api_rhymes=api_rhymes, local_rhymes=local_rhymes,
+    )
+    near_words: set[str] = set()
+    if near_index is not None:
+        near_words = collect_near_rhyming_words(near_index, words, near_radius, rhyming_words)
 
-    return rhyming_phrases
+    return [
+        result
+        for result, _ in iter_rhyming_phrases(
+            cursor, input_word, rhyming_words, filters, nsfw_enabled,
+            per_source_limit=per_source_limit, near_words=near_words,
+        )
+    ]
 
 
 if __name__ == "__main__":
@@ -99,11 +676,13 @@ if __name__ == "__main__":
                         help="path to the DB instance to connect to"
                         )
     parser.add_argument("input",
-                        nargs="+",
+                        nargs="*",
                         help="the input to find related rhymes for",
                         )
     parser.add_argument("--std-in",
-                        help="if present, read input from stdin. each line corresponds to an input",
+                        action="store_true",
+                        help="""if present, read input from stdin. each line corresponds to an input.
+                        prints one line of JSON per input""",
                         )
     parser.add_argument("--mode",
                         # took out phrase for now
@@ -130,7 +709,50 @@ if __name__ == "__main__":
         help="include offensive words in the results"
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--no-api",
+        dest="api_fallback",
+        action="store_false",
+        default=True,
+        help="only use the local rhyme index, never ask Datamuse"
+    )
+
+    parser.add_argument(
+        "--match",
+        choices=MATCH_MODES,
+        default="exact",
+        help="""
+        exact: only perfect rhymes.
+        near: also rhymes within --near-radius phoneme edits"""
+    )
+
+    parser.add_argument(
+        "--near-radius",
+        type=int,
+        default=DEFAULT_RADIUS,
+        help="maximum phoneme edit distance of near rhymes"
+    )
+
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=DEFAULT_PER_SOURCE_LIMIT,
+        help="maximum number of results per source"
+    )
+
+    parser.add_argument(
+        "--api-deadline",
+        type=float,
+        default=DEFAULT_API_DEADLINE,
+        help="seconds to wait for all Datamuse responses"
+    )
+
+    parser.add_argument(
+        "--rhyme-cache",
+        help="path to a SQLite file caching Datamuse responses between runs"
+    )
+
+    args = parser.parse_intermixed_args()
 
     conn_path = args.db_path
     conn = sql.connect(conn_path)
@@ -141,5 +763,22 @@ if __name__ == "__main__":
     filters: list[str] = args.filters
 
 
-    results = find_rhymes(cursor, input, mode, filters, args.nsfw)
-    print(json.dumps(results))
+    rhyme_cache = RhymeCache(args.rhyme_cache) if args.rhyme_cache else None
+    near_index = NearRhymeIndex.from_db(cursor) if args.match == "near" else None
+
+    if args.std_in:
+        inputs = [line.strip() for line in sys.stdin if line.strip()]
+        batch = find_rhymes_batch(
+            cursor, inputs, mode, filters, args.nsfw, api_fallback=args.api_fallback, rhyme_cache=rhyme_cache,
+            per_source_limit=args.limit, api_deadline=args.api_deadline, near_index=near_index, near_radius=args.near_radius,
+        )
+        for line, results in zip(inputs, batch):
+            print(json.dumps({"input": line, "output": results}))
+    elif input:
+        results = find_rhymes(
+            cursor, input, mode, filters, args.nsfw, api_fallback=args.api_fallback, rhyme_cache=rhyme_cache,
+            per_source_limit=args.limit, api_deadline=args.api_deadline, near_index=near_index, near_radius=args.near_radius,
+        )
+        print(json.dumps(results))
+    else:
+        parser.error("no input given, pass words as arguments or use --std-in")
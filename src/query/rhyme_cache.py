@@ -0,0 +1,150 @@
+import json
+import sqlite3 as sql
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+
+"""
+Cache for rhyme API responses.
+An in-memory LRU tier sits in front of an on-disk tier stored in a SQLite side table,
+so responses survive restarts and are shared between worker processes.
+"""
+
+# one week
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_SIZE = 10_000
+DEFAULT_MAX_DISK_ROWS = 200_000
+# puts between purges of the on-disk tier, which can exceed max_disk_rows by this much in between
+PURGE_INTERVAL = 1000
+
+
+class RhymeCache:
+    """
+    word -> rhymes, with entries expiring ttl seconds after they were fetched.
+    The memory tier holds at most max_size entries, evicting the least recently used.
+    The disk tier is purged of expired entries, and of the oldest ones beyond max_disk_rows,
+    on startup and every PURGE_INTERVAL puts.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = DEFAULT_TTL,
+        max_size: int = DEFAULT_MAX_SIZE,
+        max_disk_rows: int = DEFAULT_MAX_DISK_ROWS,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_disk_rows = max_disk_rows
+        self._puts_since_purge = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # word -> (fetched_at, rhymes)
+        self._memory: OrderedDict[str, tuple[float, list[str]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._conn = sql.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL lets other processes read while one of them writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rhyme_cache(
+                word TEXT PRIMARY KEY,
+                rhymes TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS rhyme_cache_fetched_at ON rhyme_cache(fetched_at)"
+        )
+        self.purge()
+
+    def _expired(self, fetched_at: float, now: float) -> bool:
+        return now - fetched_at >= self.ttl
+
+    def _remember(self, word: str, fetched_at: float, rhymes: list[str]):
+        """
+        Puts an entry in the memory tier, evicting if needed. Caller holds the lock
+        """
+        self._memory[word] = (fetched_at, rhymes)
+        self._memory.move_to_end(word)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def get(self, word: str) -> list[str] | None:
+        """
+        Returns the cached rhymes of word, or None if absent or expired
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(word)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(word)
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._memory[word]
+
+            row = self._conn.execute(
+                "SELECT rhymes, fetched_at FROM rhyme_cache WHERE word = ?", (word,)
+            ).fetchone()
+            if row is not None and not self._expired(row[1], now):
+                rhymes = json.loads(row[0])
+                self._remember(word, row[1], rhymes)
+                self.disk_hits += 1
+                return rhymes
+
+            self.misses += 1
+            return None
+
+    def put(self, word: str, rhymes: Iterable[str]):
+        """
+        Stores rhymes in both tiers
+        """
+        rhymes = list(rhymes)
+        now = time.time()
+        with self._lock:
+            self._remember(word, now, rhymes)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rhyme_cache(word, rhymes, fetched_at) VALUES(?, ?, ?)",
+                (word, json.dumps(rhymes), now),
+            )
+            self._puts_since_purge += 1
+            if self._puts_since_purge < PURGE_INTERVAL:
+                return
+        self.purge()
+
+    def purge(self):
+        """
+        Removes expired entries from the on-disk tier, then the oldest beyond max_disk_rows
+        """
+        with self._lock:
+            self._puts_since_purge = 0
+            self._conn.execute(
+                "DELETE FROM rhyme_cache WHERE fetched_at <= ?", (time.time() - self.ttl,)
+            )
+            self._conn.execute(
+                """
+                DELETE FROM rhyme_cache WHERE word IN (
+                    SELECT word FROM rhyme_cache ORDER BY fetched_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_disk_rows,),
+            )
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_size": len(self._memory),
+        }
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,90 @@
+import heapq
+import math
+from collections.abc import Iterable
+
+"""
+Ranks candidate puns produced by the query modules.
+Only the best k candidates are kept, using a bounded heap rather than sorting all of them.
+"""
+
+# how good a pun each kind of rhyme makes
+DEFAULT_MATCH_WEIGHTS: dict[str, float] = {
+    "exact": 1.0,
+    "near": 0.6,
+}
+
+# phrases up to this many words are not penalized for length
+IDEAL_PHRASE_WORDS = 4
+
+DEFAULT_TOP_K = 20
+
+
+def push_bounded(heap: list, entry: tuple, size: int):
+    """
+    Adds entry to a min-heap holding the best size entries, dropping the worst if it is full
+    """
+    if len(heap) < size:
+        heapq.heappush(heap, entry)
+    elif size > 0 and entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+
+class PunRanker:
+    """
+    Scores candidates (query result dicts) by
+        - rhyme quality ('match': exact or near rhyme)
+        - phrase length (shorter phrases make punchier puns)
+        - source weight (per source name, 1.0 when not given)
+        - rarity of the rhyme word ('rhyme_frequency': rarer words stand out more)
+    """
+
+    def __init__(
+        self,
+        source_weights: dict[str, float] | None = None,
+        match_weights: dict[str, float] = DEFAULT_MATCH_WEIGHTS,
+        length_weight: float = 1.0,
+        rarity_weight: float = 1.0,
+    ):
+        self.source_weights = {} if source_weights is None else source_weights
+        self.match_weights = match_weights
+        self.length_weight = length_weight
+        self.rarity_weight = rarity_weight
+
+    def score(self, result: dict) -> float:
+        match = self.match_weights.get(result.get("match", "exact"), 0.0)
+        source = self.source_weights.get(result["metadata"].get("source"), 1.0)
+
+        words = len(result["original_phrase"].split())
+        length = 1 / (1 + max(0, words - IDEAL_PHRASE_WORDS) / IDEAL_PHRASE_WORDS)
+
+        frequency = result.get("rhyme_frequency", 1)
+        rarity = 1 / (1 + math.log1p(frequency))
+
+        return match * source * (self.length_weight * length + self.rarity_weight * rarity)
+
+    def top_k(self, results: Iterable[dict], k: int = DEFAULT_TOP_K, per_source_limit: int | None = None) -> list[dict]:
+        """
+        Returns the k best results, best first, as copies with a 'score' added.
+        Equal scores keep their original order.
+        per_source_limit: at most this many results of each source are kept, the best ones by score;
+        None or a negative limit keeps them all, like query_rhymes.NO_PER_SOURCE_LIMIT
+        """
+        if k <= 0:
+            return []
+
+        # -i makes later results lose ties, and keeps dicts from being compared
+        entries = ((self.score(result), -i, result) for i, result in enumerate(results))
+        if per_source_limit is not None and per_source_limit >= 0:
+            sources: dict[str, list[tuple[float, int, dict]]] = {}
+            for entry in entries:
+                push_bounded(sources.setdefault(entry[2]["metadata"].get("source"), []), entry, per_source_limit)
+            entries = (entry for source_heap in sources.values() for entry in source_heap)
+
+        # min-heap of the best k seen so far, the worst of them on top
+        heap: list[tuple[float, int, dict]] = []
+        for entry in entries:
+            push_bounded(heap, entry, k)
+
+        return [
+            {**result, "score": score} for score, _, result in sorted(heap, reverse=True)
+        ]
@@ -1,6 +1,9 @@
 import unittest
 import importer_json_to_sqlite as im
 import sqlite3 as sql
+import contextlib
+import io
+import json
 
 """
 Tests for importer_json_to_sqlite
@@ -69,6 +72,49 @@ class ImportWord(ImportTestBase):
         pass
 
 
+class RhymeKeys(unittest.TestCase):
+    def test_stressed_syllable(self):
+        self.assertEqual("eɪtəʊ", im.phonetic_to_rhyme_key("pəˈteɪ.təʊ"))
+        self.assertEqual("æpi", im.phonetic_to_rhyme_key("ʌnˈhæp.i"))
+
+    def test_unstressed_monosyllable(self):
+        self.assertEqual("æt", im.phonetic_to_rhyme_key("kæt"))
+        self.assertEqual("æt", im.phonetic_to_rhyme_key("/hæt/"))
+
+    def test_no_vowels(self):
+        self.assertIsNone(im.phonetic_to_rhyme_key("ˈstr"))
+
+
+class ImportWordRhyme(ImportTestBase):
+    def test_rhyme_key_inserted(self):
+        im.import_item_word(
+            self.cursor,
+            {"type": "word", "spellings": "cat", "phonetics": "kæt", "source": {}},
+        )
+        self.assertEqual(
+            [("cat", "æt")],
+            self.cursor.execute(
+                """
+                SELECT ws.spelling, wr.rhyme_key
+                FROM word_rhyme AS wr
+                INNER JOIN word_spelling AS ws
+                ON wr.word_id = ws.word_id"""
+            ).fetchall(),
+        )
+
+    def test_rebuild(self):
+        im.import_item_word(
+            self.cursor,
+            {"type": "word", "spellings": "hat", "phonetics": "hæt", "source": {}},
+        )
+        self.cursor.execute("DELETE FROM word_rhyme")
+        im.rebuild_rhyme_keys(self.cursor)
+        self.assertEqual(
+            [("æt",)],
+            self.cursor.execute("SELECT rhyme_key FROM word_rhyme").fetchall(),
+        )
+
+
 class AltPhraseSplitting(unittest.TestCase):
     """
     Testing alternative phrase splitter
@@ -224,6 +270,28 @@ class ImportPhrase(ImportTestBase):
             {"type": "phrase", "phrase": "this is my phrase", "source": {}},
         )
 
+    def test_phrase_search(self):
+        im.import_item_phrase(
+            self.cursor,
+            {"type": "phrase", "phrases": ["Salt and Pepper"], "source": {"name": "Idioms"}},
+        )
+        self.cursor.execute("UPDATE phrase SET is_nsfw = 1")
+        self.assertEqual(
+            [("salt and pepper", "Idioms", 1)],
+            self.cursor.execute(
+                "SELECT phrase_norm, source_name, is_nsfw FROM phrase_search"
+            ).fetchall(),
+        )
+
+        self.cursor.execute("DELETE FROM phrase_search")
+        im.rebuild_phrase_search(self.cursor)
+        self.assertEqual(
+            [("salt and pepper", "Idioms", 1)],
+            self.cursor.execute(
+                "SELECT phrase_norm, source_name, is_nsfw FROM phrase_search"
+            ).fetchall(),
+        )
+
     def test_multi_phrase(self):
         im.import_item_phrase(
             self.cursor,
@@ -234,6 +302,136 @@ class ImportPhrase(ImportTestBase):
             },
         )
 
+    def test_batched_spellings(self):
+        caches = im.IdCaches()
+        # in the DB, but not in caches
+        known_id = im.spelling_to_id(self.cursor, "pepper")
+        ids = im.spellings_to_ids(self.cursor, ["salt", "pepper", "salt", "spray"], caches)
+        self.assertEqual({"salt", "pepper", "spray"}, set(ids))
+        self.assertEqual(known_id, ids["pepper"])
+        self.assertEqual(ids, {w: im.spelling_to_id(self.cursor, w) for w in ids})
+        self.assertEqual(ids, {w: caches.word_spellings.get(w) for w in ids})
+        self.assertEqual({}, im.spellings_to_ids(self.cursor, [], caches))
+
+
+class IdCaches(ImportTestBase):
+    def test_lru_eviction(self):
+        cache = im.IdCache(max_size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(1, cache.get("a"))
+        cache.put("c", 3)
+        # "b" was the least recently used
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(
+            {"size": 2, "max_size": 2, "hits": 1, "misses": 1, "evictions": 1}, cache.stats()
+        )
+
+    def test_only_given_caches_used(self):
+        caches = im.IdCaches()
+        word_id = im.spelling_to_id(self.cursor, "apple", caches)
+        im.import_item_phrase(
+            self.cursor, {"type": "phrase", "phrases": ["banana split"], "source": {"name": "x"}}
+        )
+        self.assertEqual(word_id, caches.word_spellings.get("apple"))
+        self.assertIsNone(caches.word_spellings.get("banana"))
+        self.assertEqual(0, len(caches.tags))
+
+    def test_preload(self):
+        ids = im.spellings_to_ids(self.cursor, ["apple", "banana", "cherry"])
+        im.tag_to_id(self.cursor, "name")
+
+        caches = im.IdCaches()
+        caches.preload(self.cursor)
+        self.assertEqual(ids, im.spellings_to_ids(self.cursor, ids, caches))
+        self.assertEqual(3, caches.word_spellings.hits)
+        self.assertEqual(0, caches.word_spellings.misses)
+        self.assertEqual(1, len(caches.tags))
+
+        # capped, only the most recent spellings are loaded
+        caches = im.IdCaches(max_spellings=2)
+        caches.preload(self.cursor)
+        self.assertIsNone(caches.word_spellings.get("apple"))
+        self.assertEqual(ids["cherry"], caches.word_spellings.get("cherry"))
+
+
+class BulkTestBase(unittest.TestCase):
+    """provides an in-memory DB in autocommit mode, and phrase item lines"""
+
+    def setUp(self):
+        self.conn = sql.connect(":memory:", isolation_level=None)
+        self.cursor = self.conn.cursor()
+        im.create_all_tables(self.cursor)
+
+    def lines(self, count: int) -> list[str]:
+        return [
+            json.dumps({"type": "phrase", "phrase": f"phrase number {i}", "source": {"name": "bulk"}})
+            for i in range(count)
+        ]
+
+    def count_phrases(self) -> int:
+        return self.cursor.execute("SELECT COUNT(*) FROM phrase").fetchone()[0]
+
+
+class ImportBulk(BulkTestBase):
+    def test_batches(self):
+        self.assertEqual(5, im.import_stream_bulk(self.cursor, self.lines(5), batch_size=2))
+        self.assertEqual(5, self.count_phrases())
+        self.assertFalse(self.conn.in_transaction)
+
+    def test_failed_batch_rolled_back(self):
+        caches = im.IdCaches()
+        lines = self.lines(3) + ["{not json"] + self.lines(2)
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(json.JSONDecodeError):
+                im.import_stream_bulk(self.cursor, lines, batch_size=2, caches=caches)
+        # the first batch was committed, the one with the bad line was not
+        self.assertEqual(2, self.count_phrases())
+        self.assertFalse(self.conn.in_transaction)
+        # the ids of the rolled back batch are forgotten
+        self.assertEqual(0, len(caches.word_spellings))
+
+
+class ImportParallel(BulkTestBase):
+    def test_prepared_items_in_order(self):
+        items = list(im.iter_prepared_items(self.lines(7), workers=2, chunk_size=2, max_pending=1))
+        self.assertEqual([f"phrase number {i}" for i in range(7)], [item["phrase"] for item in items])
+        self.assertEqual([{"phrase", "number", "3"}], items[3][im.PREPARED_PHRASE_WORDS])
+
+    def test_backpressure(self):
+        read = 0
+
+        def lines():
+            nonlocal read
+            for line in self.lines(100):
+                read += 1
+                yield line
+
+        items = im.iter_prepared_items(lines(), workers=1, chunk_size=2, max_pending=2)
+        next(items)
+        # the chunks in flight and the one waiting to be submitted, not the whole input
+        self.assertLessEqual(read, 6)
+        items.close()
+
+    def test_same_rows_as_serial(self):
+        self.assertEqual(5, im.import_stream_parallel(self.cursor, self.lines(5), workers=2, chunk_size=2))
+        serial = sql.connect(":memory:", isolation_level=None)
+        im.create_all_tables(serial.cursor())
+        im.import_stream(serial.cursor(), self.lines(5))
+        query = "SELECT p.phrase, w.spelling FROM phrase_words pw JOIN phrase p USING (phrase_id) JOIN word_spelling w USING (word_id)"
+        self.assertEqual(
+            sorted(serial.execute(query).fetchall()), sorted(self.cursor.execute(query).fetchall())
+        )
+        serial.close()
+
+    def test_failed_batch_rolled_back(self):
+        lines = self.lines(3) + ["{not json"] + self.lines(2)
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(json.JSONDecodeError):
+                im.import_stream_parallel(self.cursor, lines, workers=2, batch_size=2, chunk_size=1)
+        self.assertEqual(2, self.count_phrases())
+        self.assertFalse(self.conn.in_transaction)
+
 
 class ImportWordAssoc(ImportTestBase):
     def test_missing_assoc(self):
@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import random
+import sqlite3 as sql
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+
+HERE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(HERE, "..", "..", "src", "query"))
+sys.path.insert(0, os.path.join(HERE, "..", "..", "src", "rank"))
+sys.path.insert(0, HERE)
+import query_rhymes as qr  # noqa: E402
+from lexicon import Lexicon  # noqa: E402
+from near_rhymes import NearRhymeIndex  # noqa: E402
+from query_engine import QueryEngine  # noqa: E402
+from rank_puns import PunRanker  # noqa: E402
+import synthetic_db  # noqa: E402
+
+"""
+Benchmarks the query path against synthetic DBs of increasing size.
+Not a unit test: run it directly, e.g.
+    python test/query/benchmark_query.py --sizes 10k,100k,1M
+Datamuse is never called: inputs are drawn from the synthetic vocabulary,
+which the local rhyme index covers, and the API fallback is turned off.
+"""
+
+DEFAULT_SIZES = "10k,100k,1M"
+DEFAULT_QUERIES = 200
+WARMUP_QUERIES = 10
+BATCH_SIZE = 16
+
+SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_size(size: str) -> int:
+    size = size.strip().lower()
+    if size[-1] in SUFFIXES:
+        return int(float(size[:-1]) * SUFFIXES[size[-1]])
+    return int(size)
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(run: Callable[[list[str]], int], inputs: list[list[str]]) -> dict:
+    """
+    Times run (which returns the number of results) on each input
+    """
+    for input in inputs[:WARMUP_QUERIES]:
+        run(input)
+
+    latencies = []
+    rows = 0
+    for input in inputs:
+        start = time.perf_counter()
+        rows += run(input)
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "queries": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "rows_per_query": rows / len(latencies),
+        "rows_per_sec": rows / total if total else 0.0,
+    }
+
+
+def benchmark_db(path: str, queries: int, seed: int) -> dict[str, dict]:
+    """
+    Runs every scenario against the DB at path, returns scenario name -> stats
+    """
+    rng = random.Random(seed)
+    vocabulary = synthetic_db.spellings(path)
+    conn = sql.connect(path)
+    cursor = conn.cursor()
+    filters = [row[0] for row in cursor.execute("SELECT name FROM source")]
+    words = [[rng.choice(vocabulary)] for _ in range(queries)]
+    batches = [[rng.choice(vocabulary) for _ in range(BATCH_SIZE)] for _ in range(queries // BATCH_SIZE or 1)]
+
+    lexicon = Lexicon.from_db(cursor)
+    near_index = NearRhymeIndex(lexicon.iter_rhyme_keys())
+
+    def exact(input: list[str]) -> int:
+        return len(qr.find_rhymes(cursor, input, "word", filters, False, api_fallback=False))
+
+    def exact_lexicon(input: list[str]) -> int:
+        return len(qr.find_rhymes(cursor, input, "word", filters, False, api_fallback=False, lexicon=lexicon))
+
+    def near(input: list[str]) -> int:
+        return len(qr.find_rhymes(
+            cursor, input, "word", filters, False, api_fallback=False,
+            near_index=near_index, lexicon=lexicon,
+        ))
+
+    def batch(inputs: list[str]) -> int:
+        results = qr.find_rhymes_batch(cursor, inputs, "word", filters, False, api_fallback=False, lexicon=lexicon)
+        return sum(len(r) for r in results)
+
+    engine = QueryEngine(path, ranker=PunRanker(), use_lexicon=True)
+    engine.load()
+
+    def ranked(input: list[str]) -> int:
+        return len(engine.query(input, "word", filters, api_fallback=False))
+
+    stats = {
+        "find_rhymes": run_scenario(exact, words),
+        "find_rhymes+lexicon": run_scenario(exact_lexicon, words),
+        "find_rhymes+near": run_scenario(near, words),
+        f"find_rhymes_batch x{BATCH_SIZE}": run_scenario(batch, batches),
+        "engine+rank": run_scenario(ranked, words),
+    }
+    engine.close()
+    conn.close()
+    return stats
+
+
+def print_table(size: int, stats: dict[str, dict]):
+    print(f"\n{size:,} phrases")
+    print(f"{'scenario':<24} {'queries':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'rows/q':>8} {'rows/s':>10}")
+    for name, s in stats.items():
+        print(
+            f"{name:<24} {s['queries']:>7} {s['p50_ms']:>8.2f} {s['p90_ms']:>8.2f} {s['p99_ms']:>8.2f}"
+            f" {s['max_ms']:>8.2f} {s['rows_per_query']:>8.1f} {s['rows_per_sec']:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="punDB query benchmark",
+        description="Benchmarks the query path against synthetic DB instances",
+    )
+    parser.add_argument(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        help="comma separated phrase counts, k and M suffixes allowed (e.g. 10k,100k,1M,10M)",
+    )
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES, help="timed queries per scenario")
+    parser.add_argument("--words", type=int, default=synthetic_db.DEFAULT_WORDS, help="vocabulary size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--db-dir",
+        default=os.path.join(tempfile.gettempdir(), "pungent_bench"),
+        help="where generated DBs are kept and reused between runs",
+    )
+    parser.add_argument("--regenerate", action="store_true", help="regenerate DBs even if they exist")
+    parser.add_argument("--json", help="also write the results to this file as JSON")
+
+    args = parser.parse_args()
+    os.makedirs(args.db_dir, exist_ok=True)
+
+    results = {}
+    for size in map(parse_size, args.sizes.split(",")):
+        path = os.path.join(args.db_dir, f"phrases_{size}_words_{args.words}_seed_{args.seed}.sqlite")
+        if args.regenerate or not os.path.exists(path):
+            start = time.perf_counter()
+            synthetic_db.generate_db(path, size, args.words, seed=args.seed)
+            print(f"generated {path} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        stats = benchmark_db(path, args.queries, args.seed)
+        print_table(size, stats)
+        results[size] = stats
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
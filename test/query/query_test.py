@@ -0,0 +1,718 @@
+import unittest
+import importer_json_to_sqlite as im
+import query_rhymes as qr
+import sqlite3 as sql
+import os
+import tempfile
+import threading
+import time
+from rhyme_cache import RhymeCache
+from query_engine import QueryEngine, ResponseCache
+from async_engine import AsyncQueryEngine
+import asyncio
+from export_serving_snapshot import export_snapshot
+import near_rhymes as nr
+from lexicon import Lexicon
+from rank_puns import PunRanker
+from metrics import Metrics, METRICS
+import random
+from functools import partial
+from unittest import mock
+
+"""
+Tests for query_rhymes
+The DB is built with importer_json_to_sqlite, so both src dirs need to be importable
+"""
+
+
+class QueryTestBase(unittest.TestCase):
+    """provides setup that creates an in-memory DB with a few words and phrases"""
+
+    words = [
+        ("cat", "kæt"),
+        ("hat", "hæt"),
+        ("bat", "bæt"),
+        ("dog", "dɒɡ"),
+    ]
+
+    phrases = {
+        "Movies": ["The Cat in the Hat", "Education is key"],
+        "Idioms": ["Right off the bat", "Let sleeping dogs lie"],
+    }
+
+    def setUp(self):
+        self.conn = sql.connect(":memory:")
+        self.cursor = self.conn.cursor()
+        im.create_all_tables(self.cursor)
+        for spelling, phonetic in self.words:
+            im.import_item_word(
+                self.cursor,
+                {"type": "word", "spelling": spelling, "phonetic": phonetic, "source": {}},
+            )
+        for name, phrases in self.phrases.items():
+            im.import_item_phrase(
+                self.cursor,
+                {"type": "phrase", "phrases": phrases, "source": {"name": name}},
+            )
+
+
+class LocalRhymes(QueryTestBase):
+    def test_rhymes(self):
+        self.assertEqual({"hat", "bat"}, set(qr.find_rhymes_local(self.cursor, "cat")))
+
+    def test_unknown_word(self):
+        self.assertEqual(set(), set(qr.find_rhymes_local(self.cursor, "zebra")))
+
+    def test_alt_spellings(self):
+        im.import_item_word(
+            self.cursor,
+            {"type": "word", "spellings": ["kat", "kaat"], "phonetic": "kæt", "source": {}},
+        )
+        self.assertIn("kaat", set(qr.find_rhymes_local(self.cursor, "cat")))
+        self.assertIn("hat", set(qr.find_rhymes_local(self.cursor, "kaat")))
+
+
+class LexiconTest(QueryTestBase):
+    def setUp(self):
+        super().setUp()
+        im.import_item_word(
+            self.cursor,
+            {"type": "word", "spellings": ["kat", "kaat"], "phonetic": "kæt", "source": {}},
+        )
+        self.lexicon = Lexicon.from_db(self.cursor)
+
+    def test_matches_db(self):
+        for spelling in ["cat", "hat", "dog", "kat", "kaat", "zebra"]:
+            self.assertEqual(
+                set(qr.find_rhymes_local(self.cursor, spelling)),
+                self.lexicon.rhymes(spelling),
+                spelling,
+            )
+
+    def test_ids_and_pronunciations(self):
+        word_id = self.lexicon.word_id("hat")
+        self.assertEqual("hat", self.lexicon.spelling(word_id))
+        self.assertIsNone(self.lexicon.word_id("zebra"))
+        self.assertNotIn("zebra", self.lexicon)
+        self.assertEqual(["kæt"], self.lexicon.pronunciations("cat"))
+
+    def test_near_index(self):
+        from_db = nr.NearRhymeIndex.from_db(self.cursor)
+        from_lexicon = nr.NearRhymeIndex(self.lexicon.iter_rhyme_keys())
+        for spelling in ["cat", "dog", "kaat"]:
+            self.assertEqual(
+                from_db.near_rhymes(spelling, 2), from_lexicon.near_rhymes(spelling, 2)
+            )
+
+
+class FindRhymes(QueryTestBase):
+    def test_find_rhymes_offline(self):
+        results = qr.find_rhymes(
+            self.cursor, ["cat"], "word", ["Movies", "Idioms"], False, api_fallback=False
+        )
+        self.assertEqual(
+            {"the cat in the hat", "right off the bat"},
+            {r["original_phrase"] for r in results},
+        )
+
+    def test_per_source_limit(self):
+        im.import_item_phrase(
+            self.cursor,
+            {"type": "phrase", "phrases": ["Old hat", "right off the BAT"], "source": {"name": "Idioms"}},
+        )
+        results = qr.find_rhymes(
+            self.cursor, ["cat"], "word", ["Idioms"], False, api_fallback=False, per_source_limit=1
+        )
+        self.assertEqual(["right off the bat"], [r["original_phrase"] for r in results])
+
+        # the duplicate (differing only in case) is dropped before the limit applies
+        results = qr.find_rhymes(
+            self.cursor, ["cat"], "word", ["Idioms"], False, api_fallback=False, per_source_limit=5
+        )
+        self.assertEqual(
+            ["right off the bat", "old hat"], [r["original_phrase"] for r in results]
+        )
+
+    def test_nsfw_filtered(self):
+        self.cursor.execute(
+            "UPDATE phrase SET is_nsfw = 1 WHERE phrase = 'Right off the bat'"
+        )
+        results = qr.find_rhymes(
+            self.cursor, ["cat"], "word", ["Idioms"], False, api_fallback=False
+        )
+        self.assertEqual([], results)
+        results = qr.find_rhymes(
+            self.cursor, ["cat"], "word", ["Idioms"], True, api_fallback=False
+        )
+        self.assertEqual(1, len(results))
+
+    def test_batch_matches_single(self):
+        inputs = ["cat", "hat", "zebra", "cat"]
+        batch = qr.find_rhymes_batch(
+            self.cursor, inputs, "word", ["Movies", "Idioms"], False, api_fallback=False
+        )
+        self.assertEqual(len(inputs), len(batch))
+        for input, results in zip(inputs, batch):
+            self.assertEqual(
+                qr.find_rhymes(
+                    self.cursor, [input], "word", ["Movies", "Idioms"], False, api_fallback=False
+                ),
+                results,
+            )
+
+    def test_near_match(self):
+        im.import_item_word(
+            self.cursor,
+            {"type": "word", "spelling": "cap", "phonetic": "kæp", "source": {}},
+        )
+        im.import_item_phrase(
+            self.cursor,
+            {"type": "phrase", "phrase": "Feather in your cap", "source": {"name": "Idioms"}},
+        )
+        index = nr.NearRhymeIndex.from_db(self.cursor)
+        results = qr.find_rhymes(
+            self.cursor, ["cat"], "word", ["Idioms"], False, api_fallback=False, near_index=index
+        )
+        self.assertEqual(
+            {("right off the bat", "exact"), ("feather in your cap", "near")},
+            {(r["original_phrase"], r["match"]) for r in results},
+        )
+
+    def test_whole_tokens_only(self):
+        # 'cat' rhymes with 'hat', but must not match 'education'
+        results = qr.find_rhymes(
+            self.cursor, ["hat"], "word", ["Movies", "Idioms"], False, api_fallback=False
+        )
+        self.assertNotIn(
+            "education is key", {r["original_phrase"] for r in results}
+        )
+
+
+class NearRhymes(unittest.TestCase):
+    def test_phonemes(self):
+        self.assertEqual(("æ", "t"), nr.ipa_to_phonemes("æt"))
+        self.assertEqual(("iː", "ə", "t̬", "ɚ"), nr.ipa_to_phonemes("ˈiː.ə.t̬ɚ"))
+        self.assertEqual(("t͡ʃ", "ɪ", "p"), nr.ipa_to_phonemes("t͡ʃɪp"))
+
+    def test_distance(self):
+        self.assertEqual(0, nr.phoneme_distance(("æ", "t"), ("æ", "t")))
+        self.assertEqual(1, nr.phoneme_distance(("æ", "t"), ("æ", "p")))
+        self.assertEqual(2, nr.phoneme_distance(("æ", "t"), ("æ", "p", "s")))
+        self.assertEqual(3, nr.phoneme_distance((), ("æ", "p", "s")))
+
+    def test_bk_tree_matches_brute_force(self):
+        rng = random.Random(395)
+        alphabet = ["æ", "t", "p", "ɪ", "s", "iː"]
+        items = {tuple(rng.choices(alphabet, k=rng.randint(1, 5))) for _ in range(300)}
+        tree = nr.BKTree()
+        for item in items:
+            tree.add(item)
+        self.assertEqual(len(items), len(tree))
+
+        for query in list(items)[:20]:
+            expected = {i for i in items if nr.phoneme_distance(query, i) <= 2}
+            self.assertEqual(expected, {i for i, _ in tree.search(query, 2)})
+
+    def test_radius_one_matches_brute_force(self):
+        rng = random.Random(14)
+        alphabet = "ætpɪsb"
+        keys = sorted({"".join(rng.choices(alphabet, k=rng.randint(1, 5))) for _ in range(300)})
+        index = nr.NearRhymeIndex((key, f"word{i}") for i, key in enumerate(keys))
+        for i, key in enumerate(keys[:40]):
+            expected = {
+                f"word{j}" for j, other in enumerate(keys)
+                if nr.phoneme_distance(nr.ipa_to_phonemes(key), nr.ipa_to_phonemes(other)) == 1
+            }
+            self.assertEqual(expected, index.near_rhymes(f"word{i}", 1))
+
+    def test_index(self):
+        index = nr.NearRhymeIndex([("æt", "cat"), ("æt", "hat"), ("æp", "cap"), ("ɒɡ", "dog")])
+        self.assertEqual({"cap"}, index.near_rhymes("cat", 1))
+        self.assertEqual(set(), index.near_rhymes("zebra", 1))
+
+
+class ConcurrentApiFetch(unittest.TestCase):
+    @staticmethod
+    def slow_fetch(word: str, timeout: float) -> list[str]:
+        if word == "fail":
+            raise IOError("unreachable")
+        time.sleep(0.5 if word == "slow" else 0.1)
+        return [word + "-rhyme"]
+
+    def test_concurrent(self):
+        start = time.perf_counter()
+        results, failed = qr.fetch_rhymes_api_concurrently(
+            ["a", "b", "c", "d"], deadline=2, fetch=self.slow_fetch
+        )
+        # 4 words at 0.1s each, fetched at once
+        self.assertLess(time.perf_counter() - start, 0.35)
+        self.assertEqual({"a", "b", "c", "d"}, set(results))
+        self.assertEqual([], failed)
+
+    def test_deadline_and_failure(self):
+        results, failed = qr.fetch_rhymes_api_concurrently(
+            ["a", "slow", "fail"], deadline=0.3, fetch=self.slow_fetch
+        )
+        self.assertEqual({"a": ["a-rhyme"]}, results)
+        self.assertEqual({"slow", "fail"}, set(failed))
+
+
+class Substitution(unittest.TestCase):
+    def test_span(self):
+        substituter = qr.RhymeSubstituter("cat")
+        self.assertEqual(
+            ("right off the cat", (14, 17)),
+            substituter.substitute("right off the bat", "bat"),
+        )
+
+    def test_whole_word_first_occurrence(self):
+        substituter = qr.RhymeSubstituter("dog")
+        self.assertEqual(
+            ("batter the dog bat", (11, 14)),
+            substituter.substitute("batter the bat bat", "bat"),
+        )
+
+    def test_no_match(self):
+        substituter = qr.RhymeSubstituter("cat")
+        self.assertEqual(("old hat", None), substituter.substitute("old hat", "bat"))
+
+
+class FakeResponse:
+    def __init__(self, words: list[str]):
+        self.words = words
+
+    def raise_for_status(self):
+        pass
+
+    def json(self) -> list[dict]:
+        return [{"word": word} for word in self.words]
+
+
+class FakeAsyncClient:
+    """stands in for httpx.AsyncClient, knows one rhyme"""
+
+    def __init__(self, fail: bool = False):
+        self.requested: list[str] = []
+        self.fail = fail
+
+    async def get(self, url: str, params: dict, timeout: float):
+        self.requested.append(params["rel_rhy"])
+        await asyncio.sleep(0)
+        if self.fail:
+            raise IOError("unreachable")
+        return FakeResponse(["bat"] if params["rel_rhy"] == "zebra" else [])
+
+    async def aclose(self):
+        pass
+
+
+class EngineTest(QueryTestBase):
+    """runs the engine against a file copy of the test DB"""
+
+    def setUp(self):
+        super().setUp()
+        self.conn.commit()
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "db.sqlite")
+        dest = sql.connect(self.path)
+        self.conn.backup(dest)
+        dest.close()
+        self.engine = QueryEngine(self.path, response_cache=ResponseCache())
+
+    def tearDown(self):
+        self.engine.close()
+        self.dir.cleanup()
+
+    def test_query(self):
+        results = self.engine.query(["cat"], "word", ["Movies", "Idioms"], api_fallback=False)
+        self.assertEqual(2, len(results))
+
+    def test_ranked_before_per_source_limit(self):
+        writer = sql.connect(self.path)
+        im.import_item_phrase(
+            writer.cursor(),
+            {"type": "phrase", "phrases": ["a very long phrase that ends with an old hat", "old hat"], "source": {"name": "Movies"}},
+        )
+        writer.commit()
+        writer.close()
+        engine = QueryEngine(self.path, ranker=PunRanker())
+        results = engine.query(["cat"], "word", ["Movies"], api_fallback=False, per_source_limit=1)
+        engine.close()
+        self.assertEqual(["old hat"], [r["original_phrase"] for r in results])
+
+    def test_lexicon(self):
+        engine = QueryEngine(self.path, use_lexicon=True)
+        engine.load()
+        self.assertEqual(
+            self.engine.query(["cat"], "word", ["Movies", "Idioms"], api_fallback=False, match="near"),
+            engine.query(["cat"], "word", ["Movies", "Idioms"], api_fallback=False, match="near"),
+        )
+        engine.close()
+
+    def test_single_flight_rebuild(self):
+        engine = QueryEngine(self.path, use_lexicon=True)
+        engine.load()
+        writer = sql.connect(self.path)
+        im.bump_generation(writer.cursor())
+        writer.commit()
+        writer.close()
+
+        builds = []
+        from_db = Lexicon.from_db
+
+        def slow_from_db(cursor):
+            builds.append(cursor)
+            time.sleep(0.2)
+            return from_db(cursor)
+
+        results = []
+        with mock.patch("query_engine.Lexicon.from_db", slow_from_db):
+            threads = [
+                threading.Thread(target=lambda: results.append(
+                    engine.query(["cat"], "word", ["Movies", "Idioms"], api_fallback=False)
+                ))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        engine.close()
+        self.assertEqual(1, len(builds))
+        self.assertEqual(4, len(results))
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_response_cache(self):
+        first = self.engine.query(["Cat"], "word", ["Movies", "Idioms"], api_fallback=False)
+        second = self.engine.query(["cat "], "word", ["Idioms", "Movies"], api_fallback=False)
+        self.assertIs(first, second)
+        self.assertEqual(1, self.engine.response_cache.hits)
+
+        writer = sql.connect(self.path)
+        im.bump_generation(writer.cursor())
+        writer.commit()
+        writer.close()
+
+        third = self.engine.query(["cat"], "word", ["Movies", "Idioms"], api_fallback=False)
+        self.assertIsNot(first, third)
+        self.assertEqual(first, third)
+
+    def test_stream_pages(self):
+        expected = self.engine.query(["cat"], "word", ["Movies", "Idioms"], api_fallback=False)
+        streamed, pages = self.stream_all(1)
+        self.assertEqual(expected, streamed)
+        self.assertEqual(2, pages)
+
+    def stream_all(self, page_size: int, **kwargs) -> tuple[list[dict], int]:
+        """
+        (all results, number of pages) of streaming cat rhymes page by page
+        """
+        streamed = []
+        after = None
+        pages = 0
+        while True:
+            items = list(self.engine.stream(
+                ["cat"], "word", ["Movies", "Idioms"], api_fallback=False, after=after, page_size=page_size, **kwargs
+            ))
+            streamed.extend(items[:-1])
+            after = items[-1]["cursor"]
+            pages += 1
+            if after is None:
+                return streamed, pages
+
+    def test_stream_pages_dedup_and_limit(self):
+        writer = sql.connect(self.path)
+        im.import_item_phrase(
+            writer.cursor(),
+            {"type": "phrase", "phrases": ["Old hat", "RIGHT OFF THE BAT", "hat trick"], "source": {"name": "Idioms"}},
+        )
+        im.import_item_phrase(
+            writer.cursor(),
+            {"type": "phrase", "phrases": ["Old Hat", "bat signal"], "source": {"name": "Movies"}},
+        )
+        writer.commit()
+        writer.close()
+
+        for limit in (1, 2, 10, qr.NO_PER_SOURCE_LIMIT):
+            expected = self.engine.query(
+                ["cat"], "word", ["Movies", "Idioms"], api_fallback=False, per_source_limit=limit
+            )
+            for page_size in (1, 2, 3):
+                streamed, _ = self.stream_all(page_size, per_source_limit=limit)
+                self.assertEqual(expected, streamed)
+
+    def test_cursor_of_another_query(self):
+        items = list(self.engine.stream(
+            ["cat"], "word", ["Movies", "Idioms"], api_fallback=False, page_size=1
+        ))
+        after = items[-1]["cursor"]
+        with self.assertRaises(ValueError):
+            self.engine.stream(["cat"], "word", ["Idioms"], api_fallback=False, after=after)
+        with self.assertRaises(ValueError):
+            self.engine.stream(["hat"], "word", ["Movies", "Idioms"], api_fallback=False, after=after)
+
+    def test_async_awaits_missing_rhymes_only(self):
+        client = FakeAsyncClient()
+        engine = AsyncQueryEngine(QueryEngine(self.path), client)
+
+        async def run():
+            try:
+                return await asyncio.gather(
+                    engine.query(["zebra"], "word", filters=["Idioms"]),
+                    engine.query(["cat"], "word", filters=["Idioms"]),
+                )
+            finally:
+                await engine.close()
+
+        zebra, cat = asyncio.run(run())
+        self.assertEqual(["zebra"], client.requested)
+        self.assertEqual(["right off the bat"], [r["original_phrase"] for r in zebra])
+        self.assertEqual(["right off the bat"], [r["original_phrase"] for r in cat])
+
+    def test_async_batch_and_stream(self):
+        client = FakeAsyncClient()
+        engine = AsyncQueryEngine(QueryEngine(self.path), client)
+
+        async def run():
+            try:
+                batch = await engine.query_batch(["zebra", "cat"], "word", filters=["Idioms"])
+                page = await engine.stream(["zebra"], "word", filters=["Idioms"])
+                return batch, page
+            finally:
+                await engine.close()
+
+        batch, page = asyncio.run(run())
+        self.assertEqual(["zebra", "zebra"], client.requested)
+        self.assertEqual(
+            [["right off the bat"], ["right off the bat"]],
+            [[r["original_phrase"] for r in results] for results in batch],
+        )
+        self.assertEqual(["right off the bat"], [r["original_phrase"] for r in page[:-1]])
+        self.assertEqual({"cursor": None}, page[-1])
+
+    def test_bad_cursor(self):
+        with self.assertRaises(ValueError):
+            self.engine.stream(["cat"], after="not a cursor")
+
+    def test_failed_fetch_not_cached(self):
+        def fetch(word: str, timeout: float) -> list[str]:
+            fetched.append(word)
+            raise IOError("unreachable")
+
+        fetched = []
+        fetch_concurrently = partial(qr.fetch_rhymes_api_concurrently, fetch=fetch)
+        with mock.patch.object(qr, "requests", object()), \
+                mock.patch.object(qr, "fetch_rhymes_api_concurrently", fetch_concurrently):
+            for _ in range(2):
+                self.assertEqual([], self.engine.query(["zebra"], "word", ["Idioms"]))
+        self.assertEqual(["zebra", "zebra"], fetched)
+        self.assertEqual(0, self.engine.response_cache.stats()["size"])
+
+    def test_local_rhymes_resolved_once(self):
+        def fetch(word: str, timeout: float) -> list[str]:
+            return ["hat"]
+
+        resolved = []
+
+        def find_rhymes_local(cursor, word):
+            resolved.append(word)
+            return local(cursor, word)
+
+        local = qr.find_rhymes_local
+        fetch_concurrently = partial(qr.fetch_rhymes_api_concurrently, fetch=fetch)
+        with mock.patch.object(qr, "requests", object()), \
+                mock.patch.object(qr, "fetch_rhymes_api_concurrently", fetch_concurrently), \
+                mock.patch.object(qr, "find_rhymes_local", find_rhymes_local):
+            results = self.engine.query(["cat", "zebra"], "wordblob", ["Movies", "Idioms"])
+        self.assertEqual(["cat", "zebra"], resolved)
+        self.assertEqual(
+            {"the cat in the hat", "right off the bat"}, {r["original_phrase"] for r in results}
+        )
+
+    def test_async_failed_fetch_not_cached(self):
+        client = FakeAsyncClient(fail=True)
+        engine = AsyncQueryEngine(self.engine, client)
+
+        async def run():
+            try:
+                return [await engine.query(["zebra"], "word", filters=["Idioms"]) for _ in range(2)]
+            finally:
+                await engine.close()
+
+        self.assertEqual([[], []], asyncio.run(run()))
+        self.assertEqual(["zebra", "zebra"], client.requested)
+        self.assertEqual(0, self.engine.response_cache.stats()["size"])
+
+
+class SnapshotTest(QueryTestBase):
+    """runs the engine against a serving snapshot of a file copy of the test DB"""
+
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "db.sqlite")
+        self.snapshot_path = os.path.join(self.dir.name, "snapshot.sqlite")
+        self.export(page_size=8192)
+        self.engine = QueryEngine(
+            self.snapshot_path, response_cache=ResponseCache(), snapshot=True
+        )
+
+    def tearDown(self):
+        self.engine.close()
+        self.dir.cleanup()
+
+    def export(self, **kwargs):
+        self.conn.commit()
+        dest = sql.connect(self.path)
+        self.conn.backup(dest)
+        dest.close()
+        export_snapshot(self.path, self.snapshot_path, **kwargs)
+
+    def test_missing_source(self):
+        missing = os.path.join(self.dir.name, "missing.sqlite")
+        dest = os.path.join(self.dir.name, "other_snapshot.sqlite")
+        with self.assertRaises(FileNotFoundError):
+            export_snapshot(missing, dest)
+        self.assertFalse(os.path.exists(missing))
+        self.assertEqual(["db.sqlite", "snapshot.sqlite"], sorted(os.listdir(self.dir.name)))
+
+    def test_only_query_tables(self):
+        conn = sql.connect(self.snapshot_path)
+        tables = {
+            row[0]
+            for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+        self.assertIn("phrase_search", tables)
+        self.assertIn("word_rhyme", tables)
+        self.assertNotIn("phrase", tables)
+        self.assertEqual(8192, conn.execute("PRAGMA page_size").fetchone()[0])
+        conn.close()
+
+    def test_swap(self):
+        self.assertEqual(1, len(self.engine.query(["hat"], "word", ["Idioms"], api_fallback=False)))
+
+        im.import_item_phrase(
+            self.cursor,
+            {"type": "phrase", "phrases": ["Like a bat out of hell"], "source": {"name": "Idioms"}},
+        )
+        im.bump_generation(self.cursor)
+        self.export()
+
+        self.assertEqual(2, len(self.engine.query(["hat"], "word", ["Idioms"], api_fallback=False)))
+
+    def test_swap_same_generation(self):
+        # a snapshot rebuilt from scratch can come back with the generation of the one it replaces
+        lexicon_engine = QueryEngine(self.snapshot_path, snapshot=True, use_lexicon=True)
+        self.assertEqual(1, len(self.engine.query(["hat"], "word", ["Idioms"], api_fallback=False)))
+        self.assertEqual(1, len(lexicon_engine.query(["hat"], "word", ["Idioms"], api_fallback=False)))
+
+        im.import_item_word(
+            self.cursor, {"type": "word", "spelling": "rat", "phonetic": "ræt", "source": {}}
+        )
+        im.import_item_phrase(
+            self.cursor,
+            {"type": "phrase", "phrases": ["Like a bat out of hell", "Rat race"], "source": {"name": "Idioms"}},
+        )
+        self.export()
+
+        self.assertEqual(3, len(self.engine.query(["hat"], "word", ["Idioms"], api_fallback=False)))
+        self.assertEqual(3, len(lexicon_engine.query(["hat"], "word", ["Idioms"], api_fallback=False)))
+        lexicon_engine.close()
+
+
+class MetricsTest(QueryTestBase):
+    def test_render(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.observe_stage("sql", 0.05)
+        metrics.observe_stage("sql", 0.5)
+        metrics.inc("sql_rows_read_total", 3)
+        text = metrics.render({"response_cache_hits_total": 2})
+        self.assertIn("# TYPE pungent_stage_seconds histogram", text)
+        self.assertIn('pungent_stage_seconds_bucket{stage="sql",le="0.1"} 1', text)
+        self.assertIn('pungent_stage_seconds_bucket{stage="sql",le="+Inf"} 2', text)
+        self.assertIn('pungent_stage_seconds_count{stage="sql"} 2', text)
+        self.assertIn("# TYPE pungent_sql_rows_read_total counter", text)
+        self.assertIn("pungent_sql_rows_read_total 3", text)
+        self.assertIn("# TYPE pungent_response_cache_hits_total counter", text)
+        self.assertIn("pungent_response_cache_hits_total 2", text)
+
+    def test_find_rhymes_records_stages(self):
+        METRICS.reset()
+        qr.find_rhymes(self.cursor, ["cat"], "word", ["Movies", "Idioms"], False, api_fallback=False)
+        text = METRICS.render()
+        for stage in ["local_rhymes", "sql", "substitute"]:
+            self.assertIn(f'pungent_stage_seconds_count{{stage="{stage}"}} 1', text)
+        self.assertIn("pungent_sql_rows_read_total 2", text)
+
+
+class RhymeCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "cache.sqlite")
+        self.fetched: list[str] = []
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def get(self, cache: RhymeCache, word: str) -> list[str]:
+        """
+        The cached rhymes of word, made up and cached on a miss
+        """
+        rhymes = cache.get(word)
+        if rhymes is None:
+            self.fetched.append(word)
+            rhymes = [word + "-rhyme"]
+            cache.put(word, rhymes)
+        return rhymes
+
+    def disk_words(self) -> list[str]:
+        conn = sql.connect(self.path)
+        words = [row[0] for row in conn.execute("SELECT word FROM rhyme_cache ORDER BY word")]
+        conn.close()
+        return words
+
+    def test_memory_then_disk(self):
+        cache = RhymeCache(self.path)
+        self.assertEqual(["cat-rhyme"], self.get(cache, "cat"))
+        self.assertEqual(["cat-rhyme"], self.get(cache, "cat"))
+        cache.close()
+
+        # a new instance (e.g. after a restart) only has the disk tier
+        cache = RhymeCache(self.path)
+        self.assertEqual(["cat-rhyme"], self.get(cache, "cat"))
+        self.assertEqual(["cat"], self.fetched)
+        self.assertEqual(1, cache.disk_hits)
+        cache.close()
+
+    def test_lru_eviction(self):
+        cache = RhymeCache(self.path, max_size=2)
+        for word in ("a", "b", "a", "c"):
+            self.get(cache, word)
+        self.assertEqual(["a", "c"], list(cache._memory))
+        self.assertEqual({"memory_hits": 1, "disk_hits": 0, "misses": 3, "memory_size": 2}, cache.stats())
+        cache.close()
+
+    def test_expiry(self):
+        cache = RhymeCache(self.path, ttl=0)
+        self.get(cache, "cat")
+        self.get(cache, "cat")
+        self.assertEqual(["cat", "cat"], self.fetched)
+        cache.close()
+
+    def test_disk_purged_on_startup(self):
+        cache = RhymeCache(self.path)
+        for word in ("a", "b", "c"):
+            self.get(cache, word)
+        cache.close()
+
+        cache = RhymeCache(self.path, max_disk_rows=2)
+        # the oldest entry goes first
+        self.assertEqual(["b", "c"], self.disk_words())
+        cache.close()
+
+        RhymeCache(self.path, ttl=0).close()
+        self.assertEqual([], self.disk_words())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import argparse
+import os
+import random
+import sqlite3 as sql
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src", "import"))
+import importer_json_to_sqlite as im  # noqa: E402
+
+"""
+Generates DB instances of any size with the importer's schema, for benchmarks.
+Words are built from syllables with matching IPA, so they share rhyme keys like real words do.
+Phrases draw their words from a Zipf distribution, so a few rhyme words match many phrases.
+The same seed and sizes always give the same DB.
+"""
+
+# (spelling, IPA) of syllable onsets, and of the vowels and codas making up the rhyming part
+ONSETS = [
+    ("b", "b"), ("c", "k"), ("d", "d"), ("f", "f"), ("g", "ɡ"), ("h", "h"), ("l", "l"),
+    ("m", "m"), ("n", "n"), ("p", "p"), ("r", "ɹ"), ("s", "s"), ("t", "t"), ("w", "w"),
+]
+VOWELS = [
+    ("a", "æ"), ("o", "ɒ"), ("i", "ɪ"), ("ai", "eɪ"), ("ee", "iː"), ("igh", "aɪ"),
+    ("oa", "əʊ"), ("u", "ʌ"), ("e", "ɛ"), ("oo", "ʊ"), ("ar", "ɑː"), ("ou", "aʊ"),
+]
+CODAS = [
+    ("", ""), ("t", "t"), ("g", "ɡ"), ("ng", "ŋ"), ("m", "m"), ("n", "n"), ("l", "l"),
+    ("k", "k"), ("p", "p"), ("d", "d"), ("s", "s"), ("sh", "ʃ"), ("ch", "tʃ"), ("nd", "nd"),
+]
+# unstressed syllables put in front of the rhyming one
+PREFIXES = [("", ""), ("a", "ə"), ("be", "bɪ"), ("re", "ɹɪ"), ("un", "ʌn"), ("de", "dɪ")]
+
+DEFAULT_WORDS = 5000
+DEFAULT_SOURCES = 20
+PHRASE_WORDS = (3, 8)
+NSFW_RATE = 0.01
+BATCH_SIZE = 10_000
+
+
+def make_words(count: int, rng: random.Random) -> list[tuple[str, str]]:
+    """
+    count distinct (spelling, IPA) pairs
+    """
+    words: dict[str, str] = {}
+    while len(words) < count:
+        prefix, prefix_ipa = rng.choice(PREFIXES)
+        onset, onset_ipa = rng.choice(ONSETS)
+        vowel, vowel_ipa = rng.choice(VOWELS)
+        coda, coda_ipa = rng.choice(CODAS)
+        # a numeric suffix keeps spellings unique once the combinations run out
+        combinations = len(PREFIXES) * len(ONSETS) * len(VOWELS) * len(CODAS)
+        suffix = "" if len(words) < combinations // 2 else str(len(words))
+        spelling = prefix + onset + vowel + coda + suffix
+        if spelling not in words:
+            words[spelling] = f"{prefix_ipa}ˈ{onset_ipa}{vowel_ipa}{coda_ipa}"
+    return list(words.items())
+
+
+def generate_db(
+    path: str,
+    phrases: int,
+    words: int = DEFAULT_WORDS,
+    sources: int = DEFAULT_SOURCES,
+    seed: int = 0,
+):
+    """
+    Writes a DB instance with the given number of phrases to path, replacing any file there
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+
+    conn = sql.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    im.create_all_tables(cursor)
+
+    vocabulary = make_words(words, rng)
+    caches = im.IdCaches()
+    for spelling, phonetic in vocabulary:
+        im.import_item_word(
+            cursor, {"type": "word", "spelling": spelling, "phonetic": phonetic, "source": {}}, caches
+        )
+    word_ids = [im.spelling_to_id(cursor, spelling, caches) for spelling, _ in vocabulary]
+    spellings = [spelling for spelling, _ in vocabulary]
+    # Zipf: the word at rank r is picked in proportion to 1 / r
+    cumulative_weights = []
+    total = 0.0
+    for rank in range(1, len(vocabulary) + 1):
+        total += 1 / rank
+        cumulative_weights.append(total)
+
+    source_ids = [
+        (im.insert_source(cursor, {"name": f"Source {i}"}), f"Source {i}") for i in range(sources)
+    ]
+
+    # the same rows import_item_phrase writes, in batches
+    for batch_start in range(0, phrases, BATCH_SIZE):
+        phrase_rows, src_rows, word_rows, search_rows = [], [], [], []
+        for phrase_id in range(batch_start + 1, min(phrases, batch_start + BATCH_SIZE) + 1):
+            length = rng.randint(*PHRASE_WORDS)
+            picks = rng.choices(range(len(vocabulary)), cum_weights=cumulative_weights, k=length)
+            phrase = " ".join(spellings[i] for i in picks).capitalize()
+            src_id, source_name = rng.choice(source_ids)
+            is_nsfw = rng.random() < NSFW_RATE
+
+            phrase_rows.append((phrase_id, phrase, is_nsfw))
+            src_rows.append((phrase_id, src_id))
+            word_rows.extend((phrase_id, word_ids[i]) for i in set(picks))
+            search_rows.append((phrase_id, im.normalize_phrase(phrase), source_name, is_nsfw))
+
+        cursor.executemany("INSERT INTO phrase(phrase_id, phrase, is_nsfw) VALUES(?, ?, ?)", phrase_rows)
+        cursor.executemany("INSERT INTO phrase_src(phrase_id, src_id) VALUES(?, ?)", src_rows)
+        cursor.executemany("INSERT INTO phrase_words(phrase_id, word_id) VALUES(?, ?)", word_rows)
+        cursor.executemany(
+            "INSERT INTO phrase_search(phrase_id, phrase_norm, source_name, is_nsfw) VALUES(?, ?, ?, ?)",
+            search_rows,
+        )
+
+    im.bump_generation(cursor)
+    cursor.execute("COMMIT")
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def spellings(path: str) -> list[str]:
+    """
+    All spellings of a generated DB, for picking query inputs
+    """
+    conn = sql.connect(path)
+    rows = conn.execute("SELECT spelling FROM word_spelling ORDER BY word_id").fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="punDB synthetic DB generator",
+        description="Generates a DB instance with synthetic words and phrases, for benchmarks",
+    )
+    parser.add_argument("db_path", help="path to write the DB instance to")
+    parser.add_argument("phrases", type=int, help="number of phrases")
+    parser.add_argument("--words", type=int, default=DEFAULT_WORDS, help="vocabulary size")
+    parser.add_argument("--sources", type=int, default=DEFAULT_SOURCES, help="number of sources")
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    generate_db(args.db_path, args.phrases, args.words, args.sources, args.seed)
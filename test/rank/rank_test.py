@@ -0,0 +1,93 @@
+import unittest
+import rank_puns as rp
+
+"""
+Tests for rank_puns
+"""
+
+
+def result(phrase: str, source: str = "test", match: str = "exact", frequency: int = 1) -> dict:
+    return {
+        "original_phrase": phrase,
+        "rhymed_phrase": phrase,
+        "rhyme_frequency": frequency,
+        "match": match,
+        "metadata": {"source": source},
+    }
+
+
+class Score(unittest.TestCase):
+    def setUp(self):
+        self.ranker = rp.PunRanker(source_weights={"good": 2.0})
+
+    def test_exact_beats_near(self):
+        self.assertGreater(
+            self.ranker.score(result("old hat")),
+            self.ranker.score(result("old hat", match="near")),
+        )
+
+    def test_short_beats_long(self):
+        self.assertGreater(
+            self.ranker.score(result("old hat")),
+            self.ranker.score(result("a very long phrase that ends with an old hat")),
+        )
+
+    def test_source_weight(self):
+        self.assertGreater(
+            self.ranker.score(result("old hat", source="good")),
+            self.ranker.score(result("old hat")),
+        )
+
+    def test_rare_beats_common(self):
+        self.assertGreater(
+            self.ranker.score(result("old hat", frequency=2)),
+            self.ranker.score(result("old hat", frequency=2000)),
+        )
+
+
+class TopK(unittest.TestCase):
+    def setUp(self):
+        self.ranker = rp.PunRanker()
+
+    def test_top_k(self):
+        # all longer than IDEAL_PHRASE_WORDS, so the shortest win
+        results = [result("x " * n) for n in range(14, 4, -1)]
+        ranked = self.ranker.top_k(results, 3)
+        self.assertEqual(["x " * 5, "x " * 6, "x " * 7], [r["original_phrase"] for r in ranked])
+        self.assertTrue(all("score" in r for r in ranked))
+        # the inputs are left untouched
+        self.assertTrue(all("score" not in r for r in results))
+
+    def test_ties_keep_order(self):
+        results = [result(f"phrase {i}") for i in range(5)]
+        ranked = self.ranker.top_k(results, 3)
+        self.assertEqual(
+            ["phrase 0", "phrase 1", "phrase 2"], [r["original_phrase"] for r in ranked]
+        )
+
+    def test_per_source_limit(self):
+        # the best two of "a" come last, and beat everything of "b"
+        results = [result("x " * n, source="a") for n in range(9, 4, -1)]
+        results += [result("x " * n, source="b") for n in range(12, 9, -1)]
+        ranked = self.ranker.top_k(results, 10, per_source_limit=2)
+        self.assertEqual(
+            [("a", 5), ("a", 6), ("b", 10), ("b", 11)],
+            [(r["metadata"]["source"], len(r["original_phrase"].split())) for r in ranked],
+        )
+
+    def test_negative_per_source_limit(self):
+        results = [result("x " * n, source="a") for n in range(9, 4, -1)]
+        results += [result("x " * n, source="b") for n in range(12, 9, -1)]
+        self.assertEqual(
+            self.ranker.top_k(results, 10),
+            self.ranker.top_k(results, 10, per_source_limit=-1),
+        )
+        self.assertEqual(8, len(self.ranker.top_k(results, 10, per_source_limit=-1)))
+
+    def test_fewer_than_k(self):
+        self.assertEqual(1, len(self.ranker.top_k([result("old hat")], 5)))
+        self.assertEqual([], self.ranker.top_k([result("old hat")], 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
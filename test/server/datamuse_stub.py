@@ -0,0 +1,143 @@
+import argparse
+import json
+import random
+import sqlite3 as sql
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+"""
+Local stand-in for the Datamuse rhyme API (GET /words?rel_rhy=<word>&max=<n>),
+with configurable latency and error rate, for load tests.
+Point the server at it with PUNGENT_DATAMUSE_URL=http://<host>:<port>/words
+"""
+
+DEFAULT_PORT = 8765
+ONSETS = "bcdfghjklmnprstvwz"
+
+
+def synthetic_rhymes(word: str) -> list[str]:
+    """
+    Rhymes made up by swapping the first letter, for words the DB has no rhymes for
+    """
+    tail = word[1:] if len(word) > 1 else word
+    return [onset + tail for onset in ONSETS if onset + tail != word]
+
+
+class RhymeSource:
+    """
+    Answers from the rhyme keys of a DB instance if given, made-up rhymes otherwise.
+    The server only asks about words it has no rhyme keys for, so with a DB those get made-up rhymes too
+    """
+
+    def __init__(self, db_path: str | None = None):
+        self._by_word: dict[str, list[str]] = {}
+        if db_path is None:
+            return
+        conn = sql.connect(db_path)
+        by_key: dict[str, list[str]] = {}
+        word_keys: dict[str, list[str]] = {}
+        rows = conn.execute(
+            """
+            SELECT r.rhyme_key, ws.spelling
+            FROM word_rhyme r
+            JOIN word_spelling ws ON ws.word_id = r.word_id
+            """
+        )
+        for rhyme_key, spelling in rows:
+            by_key.setdefault(rhyme_key, []).append(spelling)
+            word_keys.setdefault(spelling, []).append(rhyme_key)
+        conn.close()
+        for spelling, keys in word_keys.items():
+            self._by_word[spelling] = sorted(
+                {rhyme for key in keys for rhyme in by_key[key] if rhyme != spelling}
+            )
+
+    def rhymes(self, word: str) -> list[str]:
+        return self._by_word.get(word) or synthetic_rhymes(word)
+
+
+def make_handler(source: RhymeSource, latency: float, jitter: float, error_rate: float, seed: int):
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    class DatamuseHandler(BaseHTTPRequestHandler):
+        # keep-alive, like the real API
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            with rng_lock:
+                delay = max(0.0, rng.gauss(latency, jitter)) if jitter else latency
+                fail = rng.random() < error_rate
+            if delay:
+                time.sleep(delay)
+
+            if url.path != "/words" or "rel_rhy" not in query:
+                self.respond(404, {"error": "only /words?rel_rhy= is supported"})
+            elif fail:
+                self.respond(503, {"error": "injected failure"})
+            else:
+                limit = int(query.get("max", ["100"])[0])
+                words = source.rhymes(query["rel_rhy"][0].lower())[:limit]
+                self.respond(
+                    200,
+                    [{"word": word, "score": len(words) - i, "numSyllables": 1} for i, word in enumerate(words)],
+                )
+
+        def respond(self, status: int, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            # one line per request would drown the load test output
+            pass
+
+    return DatamuseHandler
+
+
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    db_path: str | None = None,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    seed: int = 0,
+) -> ThreadingHTTPServer:
+    """
+    A stand-in server, not yet serving. Port 0 picks a free port (see server.server_address)
+    """
+    handler = make_handler(RhymeSource(db_path), latency, jitter, error_rate, seed)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="Datamuse stand-in",
+        description="Serves GET /words?rel_rhy=<word> like api.datamuse.com, with injected latency and errors",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", help="DB instance to take rhymes from, made-up rhymes for words it has none for")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.db, args.latency, args.jitter, args.error_rate, args.seed)
+    print(f"serving on http://{args.host}:{server.server_address[1]}/words")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
@@ -0,0 +1,171 @@
+import argparse
+import json
+import random
+import sqlite3 as sql
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Load generator for flask-server/server.py.
+For each concurrency level of the sweep, that many clients send /query requests
+back to back for a fixed duration, and throughput and latency percentiles are reported:
+the point where latency climbs while throughput stops growing is the server's capacity.
+
+Typical setup, each in its own shell:
+    python test/server/datamuse_stub.py --db src/my_db.sqlite --latency 0.05
+    cd flask-server && PUNGENT_DATAMUSE_URL=http://127.0.0.1:8765/words PUNGENT_RHYME_CACHE_PATH= PUNGENT_RESPONSE_CACHE_SIZE=0 python server.py
+    python test/server/load_server.py --db src/my_db.sqlite --concurrency 1,2,4,8,16,32
+With the rhyme cache off, every request that needs Datamuse goes to the stub at every level,
+and without the response cache every request does the full work, see test/server/README.md.
+"""
+
+DEFAULT_URL = "http://127.0.0.1:5000/query"
+DEFAULT_CONCURRENCY = "1,2,4,8,16,32"
+DEFAULT_DURATION = 10.0
+REQUEST_TIMEOUT = 30.0
+# used when no DB is given to draw inputs and sources from
+DEFAULT_WORDS = ["cat", "dog", "time", "light", "day", "heart", "love", "money", "game", "cold"]
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def inputs_from_db(db_path: str, limit: int) -> tuple[list[str], list[str]]:
+    """
+    (words, source names) of a DB instance; words that appear in phrases come first
+    """
+    conn = sql.connect(db_path)
+    words = [
+        row[0]
+        for row in conn.execute(
+            """
+            SELECT ws.spelling
+            FROM word_spelling ws
+            JOIN phrase_words pw ON pw.word_id = ws.word_id
+            GROUP BY ws.word_id
+            ORDER BY COUNT(*) DESC
+            LIMIT ?
+            """,
+            (limit,),
+        )
+    ]
+    sources = [row[0] for row in conn.execute("SELECT name FROM source WHERE name != ''")]
+    conn.close()
+    return words, sources
+
+
+def send_query(url: str, word: str, sources: list[str], match: str) -> bool:
+    """
+    Sends one /query request, returns whether it succeeded
+    """
+    body = json.dumps({
+        "input": word,
+        "filters": {source: True for source in sources},
+        "allowNSFW": False,
+        "match": match,
+    }).encode()
+    request = urllib.request.Request(url, body, {"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            response.read()
+            return response.status == 200
+    except (urllib.error.URLError, TimeoutError, ConnectionError):
+        return False
+
+
+def run_level(
+    url: str, concurrency: int, duration: float, words: list[str], sources: list[str], match: str, seed: int
+) -> dict:
+    """
+    concurrency clients sending requests back to back for duration seconds
+    """
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(client_id: int):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + client_id)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            ok = send_query(url, rng.choice(words), sources, match)
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(client, i) for i in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    total = len(latencies) + errors
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput_rps": len(latencies) / elapsed,
+        "error_rate": errors / total if total else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def print_row(row: dict):
+    print(
+        f"{row['concurrency']:>11} {row['requests']:>9} {row['throughput_rps']:>10.1f}"
+        f" {row['p50_ms']:>9.1f} {row['p90_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['error_rate']:>7.1%}",
+        flush=True,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="PunGenT server load test",
+        description="Sweeps concurrent /query clients and reports throughput against latency",
+    )
+    parser.add_argument("--url", default=DEFAULT_URL, help="the server's /query endpoint")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="comma separated client counts")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds per concurrency level")
+    parser.add_argument("--db", help="DB instance the server uses, to draw inputs and sources from")
+    parser.add_argument("--words", type=int, default=1000, help="distinct inputs drawn from --db")
+    parser.add_argument("--filters", type=json.loads, help="JSON list of source names, all of --db's by default")
+    parser.add_argument("--match", choices=["exact", "near"], default="exact")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the curve to this file as JSON")
+
+    args = parser.parse_args()
+
+    words, sources = DEFAULT_WORDS, []
+    if args.db:
+        words, sources = inputs_from_db(args.db, args.words)
+    if args.filters is not None:
+        sources = args.filters
+    if not sources:
+        parser.error("no sources to filter on, pass --db or --filters")
+
+    print(f"{'concurrency':>11} {'requests':>9} {'req/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    curve = []
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        row = run_level(args.url, concurrency, args.duration, words, sources, args.match, args.seed)
+        print_row(row)
+        curve.append(row)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(curve, f, indent=2)
+    if all(row["error_rate"] == 1.0 for row in curve):
+        sys.exit("every request failed, is the server running at " + args.url + "?")
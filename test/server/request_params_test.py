@@ -0,0 +1,85 @@
+import unittest
+from request_params import BadRequest, parse_batch, parse_body, parse_query, parse_stream
+
+"""
+Tests for flask-server/request_params
+flask-server needs to be importable, along with src/query and src/rank
+"""
+
+
+def body(**overrides) -> dict:
+    return {"input": "cat", "filters": {"Movies": True, "Idioms": False}, "allowNSFW": False, **overrides}
+
+
+class ParseBody(unittest.TestCase):
+    def test_object(self):
+        self.assertEqual({"input": "cat"}, parse_body(b'{"input": "cat"}'))
+
+    def test_not_json(self):
+        with self.assertRaises(BadRequest):
+            parse_body(b'{"input": ')
+
+    def test_not_an_object(self):
+        with self.assertRaises(BadRequest):
+            parse_body(b'["cat"]')
+
+
+class ParseQuery(unittest.TestCase):
+    def test_valid(self):
+        params = parse_query(body(perSourceLimit=-1, topK="5"))
+        self.assertEqual(["cat"], params["input"])
+        self.assertEqual(["Movies"], params["filters"])
+        self.assertEqual(-1, params["per_source_limit"])
+        self.assertEqual(5, params["top_k"])
+
+    def test_bad_fields(self):
+        for bad in [
+            body(input=["cat"]),
+            body(filters=["Movies"]),
+            body(match="slant"),
+            body(perSourceLimit="ten"),
+            body(perSourceLimit=-2),
+            body(topK=0),
+            {k: v for k, v in body().items() if k != "allowNSFW"},
+        ]:
+            with self.subTest(bad=bad), self.assertRaises(BadRequest):
+                parse_query(bad)
+
+
+class ParseBatch(unittest.TestCase):
+    def test_valid(self):
+        inputs, params = parse_batch(body(inputs=["cat", "dog"]))
+        self.assertEqual(["cat", "dog"], inputs)
+        self.assertNotIn("input", params)
+
+    def test_bad_fields(self):
+        for bad in [
+            body(),
+            body(inputs="cat"),
+            body(inputs=["cat", 1]),
+            body(inputs=["cat"], topK=-3),
+        ]:
+            with self.subTest(bad=bad), self.assertRaises(BadRequest):
+                parse_batch(bad)
+
+
+class ParseStream(unittest.TestCase):
+    def test_valid(self):
+        params = parse_stream(body(cursor="abc", pageSize=2))
+        self.assertEqual("abc", params["after"])
+        self.assertEqual(2, params["page_size"])
+        self.assertNotIn("top_k", params)
+
+    def test_bad_fields(self):
+        for bad in [
+            body(cursor=5),
+            body(pageSize=0),
+            body(pageSize="many"),
+            body(perSourceLimit=-5),
+        ]:
+            with self.subTest(bad=bad), self.assertRaises(BadRequest):
+                parse_stream(bad)
+
+
+if __name__ == "__main__":
+    unittest.main()